@@ -0,0 +1,255 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import enriched_store
+import percentiles
+import weekly_cube
+from rating_pipeline import (
+    METRICS_FOR_CUM_AVG,
+    POSITION_GROUPS,
+    find_position_column,
+    find_team_column,
+    get_engine,
+)
+from report import mentions_table, top_table
+from single_flight import SingleFlight
+
+# Read-only JSON API over the enriched partitions, for tools that want the dashboard's
+# top 10 lists without the Streamlit page (newsletter mailer, chat bots):
+#   python api_server.py --port 8502
+#   curl 'http://127.0.0.1:8502/top?season=2024-25&league=Bundesliga&weeks=33,34&group=ZM&metric=Overall%20Rating'
+#
+# Endpoints (all GET):
+#   /partitions                                   {season: [league, ...]}
+#   /top?season=&league=&weeks=&group=&metric=    top 10 of one metric (weeks: '1,2,3' or 'all',
+#                                                 group: a position group, or left out for all positions)
+#   /mentions?season=&league=&group=              "Most Mentioned Players" over all matchdays
+#
+# The tables are the ones the dashboard shows, computed from the weekly cube and the
+# percentile tables of the partition. Responses are cached in memory per set of query
+# parameters and carry an ETag, so clients can revalidate with If-None-Match and get a 304.
+# The enriched data is not built here: open the dashboard once (or point
+# ENRICHED_CACHE_DIR at a host where it ran) before starting the server.
+
+DATA_VERSION = os.environ.get('NEWSLETTER_DATA_VERSION', 'v1')
+
+# Number of responses kept in memory (least recently used are dropped first)
+RESPONSE_CACHE_SIZE = 1024
+
+
+class BadRequest(Exception):
+    status = HTTPStatus.BAD_REQUEST
+
+
+class NotFound(BadRequest):
+    status = HTTPStatus.NOT_FOUND
+
+
+def _json_default(value):
+    # numpy scalars (Age, counts) are not JSON serializable as they are
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _records(table):
+    return table.reset_index().to_dict('records')
+
+
+# Computes the responses of one data version. Everything it reads (partitions, cubes,
+# percentile tables) is opened once per process and shared by the request threads.
+class ReportService:
+    def __init__(self, data_version=DATA_VERSION, engine_name='numpy', cache_size=RESPONSE_CACHE_SIZE):
+        self.data_version = data_version
+        self.engine = get_engine(engine_name)
+        self.partitions = enriched_store.list_partitions(enriched_store.dataset_path(data_version))
+        self.cache_size = cache_size
+        self._responses = OrderedDict()
+        self._lock = threading.Lock()
+        # Identical requests that miss the cache at the same time share one computation
+        self._flights = SingleFlight()
+
+    def _param(self, params, name, required=True):
+        values = params.get(name)
+        if not values or not values[0]:
+            if required:
+                raise BadRequest(f"Missing parameter '{name}'")
+            return None
+        return values[0]
+
+    def _partition(self, params):
+        season = self._param(params, 'season')
+        league = self._param(params, 'league')
+        if league not in self.partitions.get(season, []):
+            raise NotFound(f"No data for season '{season}' and league '{league}'")
+        data = enriched_store.open_partition(self.data_version, season, league)
+        return season, league, data
+
+    def _position_group(self, params, required):
+        group = self._param(params, 'group', required)
+        if group is not None and group not in POSITION_GROUPS:
+            raise BadRequest(f"Unknown position group '{group}'. Choose one of: {', '.join(POSITION_GROUPS)}")
+        return group
+
+    def _weeks(self, params, data):
+        weeks = self._param(params, 'weeks')
+        if weeks == 'all':
+            return [int(week) for week in sorted(data['Week'].dropna().unique())]
+        try:
+            return sorted({int(week) for week in weeks.split(',')})
+        except ValueError:
+            raise BadRequest(f"Invalid weeks '{weeks}', expected e.g. '1,2,3' or 'all'")
+
+    def partitions_response(self, params):
+        return self.partitions
+
+    def top_response(self, params):
+        season, league, data = self._partition(params)
+        weeks = self._weeks(params, data)
+        group = self._position_group(params, required=False)
+        metric = self._param(params, 'metric')
+        if metric not in METRICS_FOR_CUM_AVG or metric not in data.columns:
+            raise NotFound(f"Unknown metric '{metric}'")
+
+        team_column = find_team_column(data)
+        position_column = find_position_column(data)
+        cube = weekly_cube.load_or_build(self.data_version, season, league, data)
+        aggregated = cube.aggregate_players(
+            data, weeks, POSITION_GROUPS[group] if group else None, [metric], self.engine.minutes_total(data)
+        )
+        # Percentiles are per position group, so the all-positions list has none (like the
+        # PSV-99 overall table on the page)
+        tables = percentiles.load_or_build(self.data_version, season) if group else None
+        table = top_table(self.engine, aggregated, metric, league, group, team_column, position_column, tables)
+        return {
+            'season': season,
+            'league': league,
+            'weeks': weeks,
+            'group': group,
+            'metric': metric,
+            'rows': [] if table is None else _records(table),
+        }
+
+    def mentions_response(self, params):
+        season, league, data = self._partition(params)
+        group = self._position_group(params, required=True)
+        cube = weekly_cube.load_or_build(self.data_version, season, league, data)
+        table = mentions_table(
+            self.engine, data, league, group, find_team_column(data), find_position_column(data), cube
+        )
+        return {'season': season, 'league': league, 'group': group, 'rows': _records(table)}
+
+    ROUTES = {
+        '/partitions': partitions_response,
+        '/top': top_response,
+        '/mentions': mentions_response,
+    }
+
+    # (body, etag) of a GET request, from the response cache when the same parameters
+    # (in any order) were asked for before
+    def response(self, path, query):
+        route = self.ROUTES.get(path)
+        if route is None:
+            raise NotFound(f"Unknown path '{path}'")
+        params = parse_qs(query)
+        key = (path, tuple(sorted((name, tuple(values)) for name, values in params.items())))
+        with self._lock:
+            if key in self._responses:
+                self._responses.move_to_end(key)
+                return self._responses[key]
+
+        return self._flights.run(key, self._compute, key, route, params)
+
+    def _compute(self, key, route, params):
+        body = json.dumps(route(self, params), default=_json_default).encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        with self._lock:
+            self._responses[key] = (body, etag)
+            while len(self._responses) > self.cache_size:
+                self._responses.popitem(last=False)
+        return body, etag
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    # Set on the server: the ReportService answering the requests
+    service = None
+
+    def _send(self, status, body=b'', etag=None):
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+            # Cached copies may be reused, but only after revalidating the ETag
+            self.send_header('Cache-Control', 'no-cache')
+        if status != HTTPStatus.NOT_MODIFIED:
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if status != HTTPStatus.NOT_MODIFIED:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            body, etag = self.service.response(url.path, url.query)
+        except BadRequest as e:
+            self._send(e.status, json.dumps({'error': str(e)}).encode())
+            return
+        except Exception as e:
+            self.log_error("%s failed: %r", self.path, e)
+            self._send(HTTPStatus.INTERNAL_SERVER_ERROR, json.dumps({'error': 'Internal error'}).encode())
+            return
+
+        if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+            self._send(HTTPStatus.NOT_MODIFIED, etag=etag)
+        else:
+            self._send(HTTPStatus.OK, body, etag)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+# Create the server (port 0 picks a free port, see server.server_address)
+def make_server(service, host='127.0.0.1', port=8502, verbose=False):
+    handler = type('Handler', (RequestHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Read-only JSON API serving the dashboard tables')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    parser.add_argument('--data-version', default=DATA_VERSION)
+    parser.add_argument('--engine', default=os.environ.get('RATING_ENGINE', 'numpy'))
+    parser.add_argument('--cache-size', type=int, default=RESPONSE_CACHE_SIZE, help='responses kept in memory')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args(argv)
+
+    path = enriched_store.dataset_path(args.data_version)
+    if not os.path.isdir(path):
+        print(f"No enriched data at {path}. Open the dashboard once to build it.", file=sys.stderr)
+        return 1
+
+    server = make_server(ReportService(args.data_version, args.engine, args.cache_size), args.host, args.port, args.verbose)
+    print(f"Serving on http://{server.server_address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,548 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+
+import numpy as np
+import pandas as pd
+
+from metric_store import MetricStore
+from rating_pipeline import (
+    ALL_METRICS,
+    FILL_GROUPS,
+    METRICS_FOR_CUM_AVG,
+    POSITION_GROUPS,
+    RATING_METRICS_TO_COLLECT,
+    STORE_COLUMNS,
+    STORE_GROUPS,
+    enrich_partitioned,
+    find_position_column,
+    find_team_column,
+    get_engine,
+    latest_player_rows,
+    metric_to_number,
+)
+import api_server
+import enriched_store
+import percentiles
+import weekly_cube
+from percentiles import build_percentile_tables
+from similarity import build_similarity_indexes
+from weekly_cube import WeeklyCube
+from report import build_report
+from single_flight import SingleFlight
+from synthetic_data import make_synthetic_data
+
+# Offline benchmarks and checks for the rating pipeline, run on synthetic data:
+#   python benchmarks.py parity
+#   python benchmarks.py engines --players 3000 --weeks 30
+#   python benchmarks.py similar --players 20000
+#   python benchmarks.py percentiles
+#   python benchmarks.py seasons --seasons 4
+#   python benchmarks.py cube --weeks 34
+#   python benchmarks.py memory --budget 32
+#   python benchmarks.py api
+#   python benchmarks.py flights --sessions 8
+#   python benchmarks.py fill
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+# Run the selection stages the dashboard runs for one league/position group
+def _selection_tables(engine, data, league, position_group):
+    position_column = find_position_column(data)
+    team_column = find_team_column(data)
+    in_group = data[position_column].isin(POSITION_GROUPS[position_group])
+    league_position_all_data = data[(data['League'] == league) & in_group]
+    weeks = sorted(league_position_all_data['Week'].dropna().unique())[-3:]
+    league_and_position_data = league_position_all_data[league_position_all_data['Week'].isin(weeks)]
+
+    aggregated = engine.aggregate_players(
+        league_and_position_data, METRICS_FOR_CUM_AVG, team_column, position_column,
+        minutes_total=engine.minutes_total(data)
+    )
+    tables = {metric: engine.top_k(aggregated, metric) for metric in METRICS_FOR_CUM_AVG}
+    tables['weekly_top_k'] = engine.weekly_top_k(
+        league_position_all_data, RATING_METRICS_TO_COLLECT, team_column, position_column
+    )
+    return tables
+
+
+# Relative tolerance per engine when comparing against the pandas reference (the numpy
+# engine keeps the metrics in float32)
+PARITY_RTOL = {'polars': 1e-9, 'numpy': 1e-6}
+
+
+# Floating-point sums differ in the last bits between engines, so exact ties can come out
+# in either order. Compare top lists ranked by the rounded value, then player.
+def _canonical(table, value_column, keys=(), decimals=9):
+    order = table.assign(_value=table[value_column].round(decimals))
+    order = order.sort_values(
+        [*keys, '_value', 'player_id'],
+        ascending=[True] * len(keys) + [False, True],
+        kind='stable'
+    )
+    return order.drop(columns=['_value', 'Rank'], errors='ignore').reset_index(drop=True)
+
+
+def run_parity(args):
+    raw = make_synthetic_data(n_players=args.players, n_weeks=args.weeks, seed=args.seed)
+    reference, other = get_engine('pandas'), get_engine(args.engine)
+
+    rtol = PARITY_RTOL[args.engine]
+    decimals = -int(np.log10(rtol)) - 2
+
+    expected = reference.enrich(raw.copy())
+    actual = other.enrich(raw.copy())
+    pd.testing.assert_frame_equal(
+        expected, actual, check_dtype=False, check_categorical=False, check_like=True, rtol=rtol
+    )
+    print(f"enrich: {len(expected)} rows x {len(expected.columns)} columns identical (rtol={rtol})")
+
+    league = expected['League'].iloc[0]
+    for group in POSITION_GROUPS:
+        expected_tables = _selection_tables(reference, expected, league, group)
+        actual_tables = _selection_tables(other, expected, league, group)
+        for name, table in expected_tables.items():
+            if name == 'weekly_top_k':
+                value_column, keys = 'Value', ('Week', 'Metric')
+            else:
+                value_column, keys = name, ()
+            pd.testing.assert_frame_equal(
+                _canonical(table, value_column, keys, decimals),
+                _canonical(actual_tables[name], value_column, keys, decimals),
+                check_dtype=False, check_categorical=False, rtol=rtol, obj=f'{group} {name}'
+            )
+    print(f"selection tables identical for {len(POSITION_GROUPS)} position groups (rtol={rtol})")
+
+
+def run_engines(args):
+    raw = make_synthetic_data(n_players=args.players, n_weeks=args.weeks, seed=args.seed)
+    for name in ('pandas', 'numpy', 'polars'):
+        try:
+            engine = get_engine(name)
+        except ImportError as e:
+            print(f"{name}: skipped ({e})")
+            continue
+        enriched, enrich_seconds = _timed(engine.enrich, raw.copy())
+        league = enriched['League'].iloc[0]
+        _, select_seconds = _timed(_selection_tables, engine, enriched, league, 'ZM')
+        print(f"{name}: enrich {enrich_seconds:.3f}s, selection {select_seconds:.3f}s ({len(enriched)} rows)")
+
+
+def _percentiles_ms(seconds):
+    p50, p95 = np.percentile(seconds, [50, 95]) * 1000
+    return f"p50 {p50:.2f}ms, p95 {p95:.2f}ms"
+
+
+# Build time of the similar-player indexes and query latency of the KD-tree compared
+# with a brute-force distance over every player of the position group
+def run_similar(args):
+    raw = make_synthetic_data(n_players=args.players, n_weeks=args.weeks, seed=args.seed)
+    data = get_engine('numpy').enrich(raw)
+    indexes, build_seconds = _timed(build_similarity_indexes, data)
+    print(f"index build: {build_seconds:.3f}s for {len(POSITION_GROUPS)} position groups ({len(data)} rows)")
+
+    rng = np.random.default_rng(args.seed)
+    for group in ('ZM', 'ST'):
+        index = indexes[group]
+        query_rows = rng.integers(0, len(index), args.queries)
+        k = min(11, len(index))
+
+        tree_seconds, brute_seconds, similar_seconds = [], [], []
+        for row in query_rows:
+            query = index.features[row:row + 1]
+            (tree_distances, _), seconds = _timed(index.trees[None].query, query, k=k)
+            tree_seconds.append(seconds)
+
+            distances, seconds = _timed(lambda: np.sort(np.linalg.norm(index.features - query, axis=1))[:k])
+            brute_seconds.append(seconds)
+            np.testing.assert_allclose(tree_distances[0], distances)
+
+            _, seconds = _timed(index.similar, index.players['player_id'].iat[row])
+            similar_seconds.append(seconds)
+
+        print(f"{group} ({len(index)} players, {index.features.shape[1]} features):")
+        print(f"  kd-tree query  {_percentiles_ms(tree_seconds)}")
+        print(f"  brute force    {_percentiles_ms(brute_seconds)}")
+        print(f"  similar table  {_percentiles_ms(similar_seconds)}")
+
+
+# Build time of the percentile tables, lookup latency against answering from the enriched
+# data (latest rows of the group, sort, binary search), and the interpolation error
+# against that exact rank percentile
+def run_percentiles(args):
+    raw = make_synthetic_data(n_players=args.players, n_weeks=args.weeks, seed=args.seed)
+    data = get_engine('numpy').enrich(raw)
+    tables, build_seconds = _timed(build_percentile_tables, data)
+    print(f"table build: {build_seconds:.3f}s for {len(tables.quantiles)} (League, position group) tables")
+
+    position_column = find_position_column(data)
+    league = data['League'].iloc[0]
+    for group in ('IV', 'ST'):
+        lookup_seconds, exact_seconds, errors = [], [], []
+        for metric in tables.metrics[:args.metrics]:
+            def exact_percentiles():
+                rows = latest_player_rows(data, ['player_id', 'League', 'Date', position_column, f'{metric}_cum_avg'])
+                rows = rows[(rows['League'] == league) & rows[position_column].isin(POSITION_GROUPS[group])]
+                ordered = np.sort(rows[f'{metric}_cum_avg'].dropna().to_numpy())
+                top = ordered[::-1][:10]
+                below = np.searchsorted(ordered, top, side='left')
+                ties = np.searchsorted(ordered, top, side='right') - below
+                return top, (below + 0.5 * (ties - 1)) / (len(ordered) - 1) * 100
+
+            (top, exact), seconds = _timed(exact_percentiles)
+            exact_seconds.append(seconds)
+            percentiles, seconds = _timed(tables.percentile, league, group, metric, top)
+            lookup_seconds.append(seconds)
+            errors.append(np.abs(percentiles - exact).max())
+
+        print(f"{league} {group} ({len(lookup_seconds)} metrics, 10 values each):")
+        print(f"  table lookup   {_percentiles_ms(lookup_seconds)}")
+        print(f"  sort per query {_percentiles_ms(exact_seconds)}")
+        print(f"  max error vs exact rank percentile: {max(errors):.2f} percentile points")
+
+
+# The stages of a query whose cost depends on the number of rows: filtering, the
+# minutes total and the per-player aggregation of the last three matchdays
+def _scan_stages(engine, data, league, position_group):
+    position_column = find_position_column(data)
+    team_column = find_team_column(data)
+    rows = data[(data['League'] == league) & data[position_column].isin(POSITION_GROUPS[position_group])]
+    weeks = sorted(rows['Week'].dropna().unique())[-3:]
+    return engine.aggregate_players(
+        rows[rows['Week'].isin(weeks)], METRICS_FOR_CUM_AVG, team_column, position_column,
+        minutes_total=engine.minutes_total(data)
+    )
+
+
+def _megabytes(data):
+    return round(data.memory_usage(deep=False).sum() / 2**20)
+
+
+# Query cost as the archive grows: the row-dependent query stages on the latest
+# (Season, League) partition against the same stages on one frame holding every season
+def run_seasons(args):
+    engine = get_engine('numpy')
+    n_seasons = 1
+    while n_seasons <= args.seasons:
+        raw = make_synthetic_data(n_players=args.players, n_weeks=args.weeks, seed=args.seed, n_seasons=n_seasons)
+        partitions = enrich_partitioned(engine, raw.copy())
+        season, league = max(partitions)
+        partition = partitions[(season, league)]
+        _, partition_seconds = _timed(_scan_stages, engine, partition, league, 'ZM')
+
+        everything = engine.enrich(raw)
+        _, frame_seconds = _timed(_scan_stages, engine, everything, league, 'ZM')
+        print(
+            f"{n_seasons} season(s): "
+            f"partition {partition_seconds:.3f}s ({len(partition)} rows, {_megabytes(partition)} MB), "
+            f"single frame {frame_seconds:.3f}s ({len(everything)} rows, {_megabytes(everything)} MB)"
+        )
+        n_seasons *= 2
+
+
+# Weekly cube against aggregating the rows: identical tables for a few matchday
+# selections, and the time of one matchday against all of them
+def run_cube(args):
+    engine = get_engine('numpy')
+    partitions = enrich_partitioned(engine, make_synthetic_data(n_players=args.players, n_weeks=args.weeks, seed=args.seed))
+    (season, league), data = max(partitions.items(), key=lambda item: len(item[1]))
+    position_column = find_position_column(data)
+    team_column = find_team_column(data)
+    minutes_total = engine.minutes_total(data)
+
+    cube, build_seconds = _timed(WeeklyCube, data)
+    print(f"build: {build_seconds:.3f}s for {len(data)} rows -> {len(cube.cell_key)} cells ({season}, {league})")
+
+    weeks = sorted(data['Week'].dropna().unique())
+    selections = {
+        'one matchday': weeks[-1:],
+        'last three': weeks[-3:],
+        'every other': weeks[::2],
+        f'All ({len(weeks)})': weeks,
+    }
+    for name, selected in selections.items():
+        for group in [*POSITION_GROUPS, None]:
+            positions = POSITION_GROUPS[group] if group else None
+            mask = data['Week'].isin(selected)
+            if positions is not None:
+                mask &= data[position_column].isin(positions)
+            expected, rows_seconds = _timed(
+                engine.aggregate_players, data[mask], METRICS_FOR_CUM_AVG, team_column, position_column, minutes_total
+            )
+            actual, cube_seconds = _timed(
+                cube.aggregate_players, data, selected, positions, METRICS_FOR_CUM_AVG, minutes_total
+            )
+            pd.testing.assert_frame_equal(
+                expected, actual, check_dtype=False, check_categorical=False, rtol=PARITY_RTOL['numpy'],
+                obj=f'{name} {group}'
+            )
+            if group == 'ZM':
+                print(f"{name}: rows {rows_seconds:.3f}s, cube {cube_seconds:.3f}s")
+    print(f"cube tables identical for {len(selections)} selections x {len(POSITION_GROUPS) + 1} position filters")
+
+    # Weekly top 10s behind "Most Mentioned Players"
+    metrics = [metric for metric in RATING_METRICS_TO_COLLECT if metric in data.columns]
+    for group, positions in POSITION_GROUPS.items():
+        rows = data[data[position_column].isin(positions)]
+        expected, rows_seconds = _timed(engine.weekly_top_k, rows, metrics, team_column, position_column)
+        actual, cube_seconds = _timed(cube.weekly_top_k, data, positions, metrics)
+        pd.testing.assert_frame_equal(
+            expected, actual, check_dtype=False, check_categorical=False, rtol=PARITY_RTOL['numpy'],
+            obj=f'weekly top 10 {group}'
+        )
+        if group == 'ZM':
+            print(f"weekly top 10s ({len(weeks)} matchdays): rows {rows_seconds:.3f}s, cube {cube_seconds:.3f}s")
+    print(f"weekly top 10s identical for {len(POSITION_GROUPS)} position groups")
+
+
+# Enrich the synthetic data into a temporary cache directory like the app does, and open
+# the first league of the latest season with its percentile tables and weekly cube
+def _benchmark_partition(engine, args):
+    raw = make_synthetic_data(n_players=args.players, n_weeks=args.weeks, seed=args.seed)
+    enriched_store.CACHE_DIR = tempfile.mkdtemp(prefix='newsletter-benchmark-')
+    partitions = enriched_store.load_or_build('benchmark', lambda: enrich_partitioned(engine, raw))
+    season = max(partitions)
+    league = partitions[season][0]
+    data = enriched_store.open_partition('benchmark', season, league)
+    tables = percentiles.load_or_build('benchmark', season)
+    cube = weekly_cube.load_or_build('benchmark', season, league, data)
+    return data, season, league, find_team_column(data), find_position_column(data), tables, cube
+
+
+# Peak memory allowed for one Run (MB), see run_memory
+PEAK_MEMORY_BUDGET_MB = float(os.environ.get('PEAK_MEMORY_BUDGET_MB', 32))
+
+
+# Peak memory of the Run computation (build_report) on a memory-mapped partition, like
+# the app runs it. The peak is what the Run allocates on top of the mapped data as
+# tracked by tracemalloc (numpy buffers and Python objects), the largest over every
+# position group and a few matchday selections. Fails when it is above the budget.
+def run_memory(args):
+    engine = get_engine('numpy')
+    data, season, league, team_column, position_column, tables, cube = _benchmark_partition(engine, args)
+    print(f"partition: {len(data)} rows x {len(data.columns)} columns, {_megabytes(data)} MB mapped ({season}, {league})")
+
+    weeks = sorted(data['Week'].dropna().unique())
+    selections = {'one matchday': weeks[-1:], 'last three': weeks[-3:], f'All ({len(weeks)})': weeks}
+    peak = 0
+    for name, selected in selections.items():
+        selection_peak = 0
+        for group in POSITION_GROUPS:
+            tracemalloc.start()
+            build_report(engine, data, league, selected, group, team_column, position_column, tables, cube)
+            selection_peak = max(selection_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        print(f"{name}: peak {selection_peak / 2**20:.1f} MB")
+        peak = max(peak, selection_peak)
+
+    peak_mb = peak / 2**20
+    print(f"peak {peak_mb:.1f} MB, budget {args.budget:g} MB")
+    if peak_mb > args.budget:
+        print("over budget")
+        return 1
+
+
+# Start the JSON API on a free localhost port over a synthetic dataset. Check that its
+# tables match the page's, that a matching If-None-Match gets a 304, and time the
+# uncached and cached responses.
+def run_api(args):
+    engine = get_engine('numpy')
+    data, season, league, team_column, position_column, tables, cube = _benchmark_partition(engine, args)
+
+    server = api_server.make_server(api_server.ReportService('benchmark'), port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+
+    def get(path, etag=None, **params):
+        request = urllib.request.Request(f'{base_url}{path}?{urlencode(params)}')
+        if etag:
+            request.add_header('If-None-Match', etag)
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                body, status, etag = response.read(), response.status, response.headers['ETag']
+        except urllib.error.HTTPError as e:
+            body, status, etag = e.read(), e.code, e.headers['ETag']
+        return status, body, etag, time.perf_counter() - start
+
+    weeks = [int(week) for week in sorted(data['Week'].dropna().unique())[-3:]]
+    report = build_report(engine, data, league, weeks, 'ZM', team_column, position_column, tables, cube)
+    expected = {heading: table for blocks in report.values() for heading, table in blocks}
+
+    first_seconds, cached_seconds = [], []
+    for metric in METRICS_FOR_CUM_AVG:
+        params = dict(season=season, league=league, weeks=','.join(map(str, weeks)), group='ZM', metric=metric)
+        status, body, etag, seconds = get('/top', **params)
+        first_seconds.append(seconds)
+        rows = json.loads(body)['rows']
+        table = expected[metric]
+        if isinstance(table, str):
+            assert rows == [], metric
+        else:
+            assert rows == json.loads(table.reset_index().to_json(orient='records')), metric
+        status, _, _, seconds = get('/top', **params)
+        cached_seconds.append(seconds)
+        status, body, _, _ = get('/top', etag=etag, **params)
+        assert status == 304 and body == b'', metric
+
+    status, body, _, _ = get('/mentions', season=season, league=league, group='ZM')
+    mentions = expected.get('Most Mentioned Players')
+    assert status == 200 and len(json.loads(body)['rows']) == (0 if mentions is None else len(mentions))
+    assert get('/top', season=season, league=league, weeks='x', metric='Goal')[0] == 400
+    assert get('/top', season=season, league='Nowhere', weeks='all', metric='Goal')[0] == 404
+    server.shutdown()
+
+    print(f"{len(METRICS_FOR_CUM_AVG)} /top lists identical to the page, 304 on a matching ETag")
+    print(f"  first request  {_percentiles_ms(first_seconds)}")
+    print(f"  cached         {_percentiles_ms(cached_seconds)}")
+
+
+# A burst of sessions pressing Run on the same selection at once, each in its own thread
+# like Streamlit sessions: every session computing its report against one shared
+# computation. Reports the wall time, the CPU time and the number of computations.
+def run_flights(args):
+    engine = get_engine('numpy')
+    data, season, league, team_column, position_column, tables, cube = _benchmark_partition(engine, args)
+    weeks = sorted(data['Week'].dropna().unique())[-1:]
+
+    computations = []
+
+    def compute():
+        computations.append(1)
+        return build_report(engine, data, league, weeks, 'ZM', team_column, position_column, tables, cube)
+
+    def burst(run):
+        computations.clear()
+        barrier = threading.Barrier(args.sessions)
+        reports = [None] * args.sessions
+
+        def session(index):
+            barrier.wait()
+            reports[index] = run()
+
+        threads = [threading.Thread(target=session, args=(index,)) for index in range(args.sessions)]
+        wall, cpu = time.perf_counter(), time.process_time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return reports, time.perf_counter() - wall, time.process_time() - cpu
+
+    flights = SingleFlight()
+    key = ('benchmark', season, league, tuple(weeks), 'ZM')
+    for name, run in (('independent', compute), ('single-flight', lambda: flights.run(key, compute))):
+        reports, wall, cpu = burst(run)
+        print(f"{name}: {args.sessions} sessions, {len(computations)} computation(s), wall {wall:.2f}s, cpu {cpu:.2f}s")
+    assert all(report is reports[0] for report in reports)
+
+
+# Conditional NaN fill of the coerced metrics: the pandas reference (mask and .loc
+# write-back per group), the same per-group loop on the metric store, and the store's
+# single-pass fill. Checks that all three fill the same cells; times are the best of
+# --repeat runs.
+def run_fill(args):
+    raw = make_synthetic_data(n_players=args.players, n_weeks=args.weeks, seed=args.seed)
+    metrics = [metric for metric in ALL_METRICS if metric in raw.columns]
+    coerced = pd.DataFrame({metric: metric_to_number(raw[metric], metric) for metric in metrics})
+
+    def new_store():
+        store = MetricStore(STORE_COLUMNS, len(coerced), STORE_GROUPS)
+        for metric in metrics:
+            store.column(metric)[:] = coerced[metric].to_numpy()
+        return store
+
+    def fill_per_group(store):
+        for group in FILL_GROUPS:
+            values = store.group(group)
+            missing = np.isnan(values)
+            np.copyto(values, 0, where=missing & ~missing.all(axis=1)[:, None])
+
+    def best(fill, make_input):
+        seconds = []
+        for _ in range(args.repeat):
+            target = make_input()
+            seconds.append(_timed(fill, target)[1])
+        return target, min(seconds)
+
+    reference, reference_seconds = best(get_engine('pandas').fill, coerced.copy)
+    per_group, per_group_seconds = best(fill_per_group, new_store)
+    store_filled, store_seconds = best(get_engine('numpy').fill_store, new_store)
+    for metric in metrics:
+        expected = reference[metric].to_numpy(dtype=np.float32)
+        np.testing.assert_array_equal(per_group.column(metric), expected, err_msg=metric)
+        np.testing.assert_array_equal(store_filled.column(metric), expected, err_msg=metric)
+
+    print(f"fill of {len(coerced)} rows x {len(metrics)} metrics, identical results")
+    print(f"  pandas reference   {reference_seconds * 1000:8.2f}ms")
+    print(f"  store, per group   {per_group_seconds * 1000:8.2f}ms")
+    print(f"  store, fill_store  {store_seconds * 1000:8.2f}ms "
+          f"({reference_seconds / store_seconds:.0f}x reference, "
+          f"{per_group_seconds / store_seconds:.1f}x per group)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline benchmarks for the rating pipeline')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parity = subparsers.add_parser('parity', help='check an engine against the pandas reference')
+    parity.add_argument('--engine', default='polars', choices=sorted(PARITY_RTOL))
+    parity.set_defaults(func=run_parity, players=300, weeks=10)
+
+    engines = subparsers.add_parser('engines', help='time enrichment and selection per engine')
+    engines.set_defaults(func=run_engines, players=3000, weeks=30)
+
+    similar = subparsers.add_parser('similar', help='time the similar-player index build and queries')
+    similar.add_argument('--queries', type=int, default=200)
+    similar.set_defaults(func=run_similar, players=20000, weeks=5)
+
+    percentile_parser = subparsers.add_parser('percentiles', help='time the percentile tables and lookups')
+    percentile_parser.add_argument('--metrics', type=int, default=20)
+    percentile_parser.set_defaults(func=run_percentiles, players=3000, weeks=10)
+
+    seasons = subparsers.add_parser('seasons', help='time a query as seasons are added to the archive')
+    seasons.add_argument('--seasons', type=int, default=4)
+    seasons.set_defaults(func=run_seasons, players=3000, weeks=34)
+
+    cube = subparsers.add_parser('cube', help='check and time the weekly cube against aggregating rows')
+    cube.set_defaults(func=run_cube, players=3000, weeks=34)
+
+    memory = subparsers.add_parser('memory', help='peak memory of a Run against a budget')
+    memory.add_argument('--budget', type=float, default=PEAK_MEMORY_BUDGET_MB,
+                        help='MB (default: $PEAK_MEMORY_BUDGET_MB or 32)')
+    memory.set_defaults(func=run_memory, players=3000, weeks=34)
+
+    api = subparsers.add_parser('api', help='check and time the JSON API on localhost')
+    api.set_defaults(func=run_api, players=3000, weeks=34)
+
+    flights_parser = subparsers.add_parser('flights', help='time a burst of identical Runs with and without single-flight')
+    flights_parser.add_argument('--sessions', type=int, default=8)
+    flights_parser.set_defaults(func=run_flights, players=3000, weeks=34)
+
+    fill = subparsers.add_parser('fill', help='time the conditional NaN fill')
+    fill.add_argument('--repeat', type=int, default=5)
+    fill.set_defaults(func=run_fill, players=3000, weeks=34)
+
+    for subparser in (parity, engines, similar, percentile_parser, seasons, cube, memory, api, flights_parser, fill):
+        subparser.add_argument('--players', type=int, default=subparser.get_default('players'))
+        subparser.add_argument('--weeks', type=int, default=subparser.get_default('weeks'))
+        subparser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,241 @@
+import fcntl
+import os
+import pickle
+import threading
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from rating_pipeline import compute_age
+
+# Directory shared by every server process on the host
+CACHE_DIR = os.environ.get('ENRICHED_CACHE_DIR', '/tmp')
+
+# Bump whenever the enrichment changes (new columns, different ratings) so stale files are not reused
+ENRICHED_FORMAT = 5
+
+# Datasets, frames and artifacts opened by this process, keyed by path. Cached entries
+# are returned without locking; opening or building a path takes that path's lock only,
+# so a long build (the dataset, a KD-tree, a cube) never blocks reruns that read other,
+# already open paths.
+_open_datasets = {}
+_open_frames = {}
+_open_artifacts = {}
+_path_locks = {}
+_path_locks_lock = threading.Lock()
+
+
+def _path_lock(path):
+    with _path_locks_lock:
+        return _path_locks.setdefault(path, threading.Lock())
+
+
+# Return cache[path], running load() once per process to fill it. A None result is not
+# cached, so the next call tries again.
+def _open_once(cache, path, load):
+    if path in cache:
+        return cache[path]
+    with _path_lock(path):
+        if path not in cache:
+            value = load()
+            if value is None:
+                return None
+            cache[path] = value
+        return cache[path]
+
+
+# Directory holding one Arrow file per (Season, League) partition of a data version
+def dataset_path(data_version):
+    return os.path.join(CACHE_DIR, f'newup1_{data_version}_enriched_f{ENRICHED_FORMAT}')
+
+
+def partition_path(dataset, season, league):
+    return os.path.join(dataset, f'season={quote(season, safe="")}', f'league={quote(league, safe="")}.arrow')
+
+
+# Small structures derived from the enriched data (search indexes, lookup tables) are
+# pickled next to it and share its format version
+def artifact_path(data_version, name):
+    return os.path.join(CACHE_DIR, f'newup1_{data_version}_{quote(name, safe="")}_f{ENRICHED_FORMAT}.pkl')
+
+
+# Artifacts made mostly of large arrays (the weekly cubes) are a directory instead: one
+# .npy file per array plus a pickle of the rest of the object
+def array_artifact_path(data_version, name):
+    return os.path.join(CACHE_DIR, f'newup1_{data_version}_{quote(name, safe="")}_f{ENRICHED_FORMAT}')
+
+
+# Convert the enriched frame to an Arrow table. Float columns keep NaN as a value instead
+# of a null, so they carry no validity bitmap and can later be handed to pandas zero-copy.
+def _to_arrow(data):
+    arrays = []
+    for name in data.columns:
+        column = data[name]
+        if column.dtype.kind == 'f':
+            arrays.append(pa.array(column.to_numpy(), from_pandas=False))
+        else:
+            arrays.append(pa.Array.from_pandas(column))
+    return pa.Table.from_arrays(arrays, names=[str(name) for name in data.columns])
+
+
+# Write an uncompressed Arrow IPC file (compression would rule out memory mapping).
+# The file is written under a temporary name and renamed, so readers never see a partial file.
+def write_enriched(data, path):
+    table = _to_arrow(data)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+# Open the file memory-mapped. Numeric, datetime and string columns point straight into
+# the mapping, so the pages live in the OS page cache once per host and not per process.
+# The returned frame is read-only and must not be modified in place.
+def open_enriched(path):
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    data = table.to_pandas(split_blocks=True)
+    # Age depends on today's date, so it is recomputed instead of trusting the stored value
+    data['Age'] = compute_age(data['DOB'])
+    return data
+
+
+# Make sure the file at path exists. The first process on the host that gets here runs
+# build() and write()s its result (under an exclusive file lock so concurrent processes
+# don't build it twice); everyone else just waits for the file. Returns False when
+# build() gave nothing to write.
+def build_once(path, build, write):
+    if os.path.exists(path):
+        return True
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            # Another process may have finished the file while we waited for the lock
+            if not os.path.exists(path):
+                result = build()
+                if result is None:
+                    return False
+                write(result, path)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return True
+
+
+# Write every partition ({(season, league): frame}) into a temporary directory and rename
+# it into place, so readers never see a partial dataset
+def write_partitions(partitions, path):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    for (season, league), data in partitions.items():
+        file_path = partition_path(tmp_path, season, league)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        write_enriched(data, file_path)
+    os.rename(tmp_path, path)
+
+
+# The partitions of a written dataset as {season: [league, ...]}, read from the directory
+# names only
+def list_partitions(dataset):
+    partitions = {}
+    for season_dir in sorted(os.listdir(dataset)):
+        if not season_dir.startswith('season='):
+            continue
+        partitions[unquote(season_dir[len('season='):])] = sorted(
+            unquote(name[len('league='):-len('.arrow')])
+            for name in os.listdir(os.path.join(dataset, season_dir))
+            if name.startswith('league=') and name.endswith('.arrow')
+        )
+    return partitions
+
+
+# Make sure the partitioned dataset of a data version exists and return its partitions
+# as {season: [league, ...]}. It is built once per host (see build_once); build() returns
+# the {(season, league): frame} partitions or None when there is nothing to write.
+def load_or_build(data_version, build):
+    path = dataset_path(data_version)
+
+    def load():
+        if not build_once(path, build, write_partitions):
+            return None
+        return list_partitions(path)
+
+    return _open_once(_open_datasets, path, load)
+
+
+# Map one (Season, League) partition. Only this file is read, so the cost of a query
+# doesn't grow with the number of seasons in the archive.
+def open_partition(data_version, season, league):
+    path = partition_path(dataset_path(data_version), season, league)
+    return _open_once(_open_frames, path, lambda: open_enriched(path))
+
+
+# All leagues of one season in a single frame. This copies the partitions, it is meant
+# for building the per-season artifacts and not for serving queries.
+def open_season(data_version, season):
+    leagues = list_partitions(dataset_path(data_version)).get(season, [])
+    return pd.concat(
+        [open_partition(data_version, season, league) for league in leagues], ignore_index=True
+    )
+
+
+def write_artifact(artifact, path):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(artifact, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+# Return a derived artifact of a data version, built once per host like the enriched
+# file and unpickled once per process
+def load_or_build_artifact(data_version, name, build):
+    path = artifact_path(data_version, name)
+
+    def load():
+        if not build_once(path, build, write_artifact):
+            return None
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    return _open_once(_open_artifacts, path, load)
+
+
+# Write the numpy array attributes of artifact as .npy files and pickle the object
+# without them, in a temporary directory that is renamed into place
+def write_array_artifact(artifact, path):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    os.makedirs(tmp_path)
+    state = dict(vars(artifact))
+    for name, value in list(state.items()):
+        if isinstance(value, np.ndarray):
+            np.save(os.path.join(tmp_path, f'{name}.npy'), state.pop(name), allow_pickle=False)
+    with open(os.path.join(tmp_path, 'object.pkl'), 'wb') as f:
+        pickle.dump((type(artifact), state), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.rename(tmp_path, path)
+
+
+# Rebuild the object with its arrays memory-mapped read-only, so like the partitions they
+# live in the OS page cache once per host and not in every process
+def open_array_artifact(path):
+    with open(os.path.join(path, 'object.pkl'), 'rb') as f:
+        artifact_class, state = pickle.load(f)
+    for file_name in os.listdir(path):
+        if file_name.endswith('.npy'):
+            state[file_name[:-len('.npy')]] = np.load(os.path.join(path, file_name), mmap_mode='r')
+    artifact = artifact_class.__new__(artifact_class)
+    artifact.__dict__.update(state)
+    return artifact
+
+
+# Like load_or_build_artifact, for artifacts stored with write_array_artifact
+def load_or_build_array_artifact(data_version, name, build):
+    path = array_artifact_path(data_version, name)
+
+    def load():
+        if not build_once(path, build, write_array_artifact):
+            return None
+        return open_array_artifact(path)
+
+    return _open_once(_open_artifacts, path, load)
@@ -0,0 +1,240 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import psutil
+
+# Offline load test for the dashboard: N simulated scouts go through
+# login -> league/matchday/position selection -> Run at the same time.
+#   python load_test.py --concurrency 1,2,4,8 --output baseline.json
+#   python load_test.py --concurrency 1,2,4,8 --baseline baseline.json
+#
+# Every session is an AppTest instance in its own process. The app reads a local parquet
+# (synthetic by default) and keeps its enriched files in a private cache directory.
+# Latency is measured per rerun inside the sessions; CPU and memory are summed over the
+# session processes.
+
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'py_streamlit_newsletter_04.py')
+USERNAME, PASSWORD = 'load-test', 'load-test'
+
+
+def _configure_environment(args):
+    cache_dir = args.cache_dir or tempfile.mkdtemp(prefix='newsletter-load-test-')
+    data_path = args.data
+    if data_path is None:
+        from synthetic_data import make_synthetic_data
+        data_path = os.path.join(cache_dir, 'synthetic.parquet')
+        make_synthetic_data(
+            n_players=args.players, n_weeks=args.weeks, seed=args.seed, n_seasons=args.seasons
+        ).to_parquet(data_path)
+    # The app opens logo.png relative to the working directory
+    os.chdir(os.path.dirname(APP_SCRIPT))
+    # Must be set before the app (and enriched_store) is imported for the first time
+    os.environ['ENRICHED_CACHE_DIR'] = cache_dir
+    os.environ['NEWSLETTER_DATA_PATH'] = data_path
+    return cache_dir
+
+
+def _button(at, label):
+    return next(button for button in at.button if button.label == label)
+
+
+# One scout: log in, then repeatedly pick a league, matchdays and a position group and
+# press Run. Returns [(step, seconds), ...] for every rerun.
+def run_session(seed, runs, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    rng = np.random.default_rng(seed)
+    timings = []
+
+    def step(name, action):
+        start = time.perf_counter()
+        at = action()
+        timings.append((name, time.perf_counter() - start))
+        if at.exception:
+            raise RuntimeError(f"{name}: {at.exception[0].value}")
+        return at
+
+    at = AppTest.from_file(APP_SCRIPT, default_timeout=timeout)
+    at.secrets['credentials'] = {'username': USERNAME, 'password': PASSWORD}
+    step('login page', at.run)
+    at.text_input(key='login_username').input(USERNAME)
+    at.text_input(key='login_password').input(PASSWORD)
+    step('login', _button(at, 'Login').click().run)
+
+    for _ in range(runs):
+        league = at.selectbox(key='select_league')
+        step('select league', league.select(rng.choice(league.options)).run)
+        matchdays = at.multiselect(key='select_matchdays')
+        # A few recent matchdays (the options start with 'All (X)')
+        picked = matchdays.options[1:1 + int(rng.integers(1, 4))]
+        step('select matchdays', matchdays.set_value(picked).run)
+        position_group = at.selectbox(key='select_position_group')
+        step('select position group', position_group.select(rng.choice(position_group.options)).run)
+        step('run', _button(at, 'Run').click().run)
+    return timings
+
+
+# Sample CPU time and memory of the session processes while they run. RSS counts pages
+# shared between processes (the memory-mapped enriched file) once per process, PSS splits
+# them between the processes that map them.
+class _ResourceMonitor(threading.Thread):
+    def __init__(self, processes, interval=0.1):
+        super().__init__(daemon=True)
+        self.processes = [psutil.Process(process.pid) for process in processes]
+        self.interval = interval
+        self.peak_rss = self.peak_pss = 0
+        self.stopped = threading.Event()
+
+    def _cpu_seconds(self):
+        return sum(sum(process.cpu_times()[:2]) for process in self.processes)
+
+    def _sample(self):
+        memory = [process.memory_full_info() for process in self.processes]
+        self.peak_rss = max(self.peak_rss, sum(info.rss for info in memory))
+        self.peak_pss = max(self.peak_pss, sum(getattr(info, 'pss', info.rss) for info in memory))
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self.cpu_start = self._cpu_seconds()
+        self.wall_start = time.perf_counter()
+        self._sample()
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.join()
+        self._sample()
+        self.wall = time.perf_counter() - self.wall_start
+        # 100% = one core fully busy
+        self.cpu_percent = 100 * (self._cpu_seconds() - self.cpu_start) / self.wall
+
+
+# Session process: import everything, wait until all sessions are ready, run the session,
+# report the timings and stay alive until the parent has read the CPU counters
+def _session_process(seed, runs, timeout, ready, done, results):
+    from streamlit.logger import set_log_level
+    from streamlit.testing.v1 import AppTest  # noqa: F401 (import before the clock starts)
+    set_log_level('error')
+    ready.wait()
+    try:
+        results.put(('ok', run_session(seed, runs, timeout)))
+    except Exception as e:
+        results.put(('error', repr(e)))
+    done.wait()
+
+
+# Run N sessions at once. Each session is its own process (AppTest swaps process-wide
+# Streamlit state on every run, so sessions can't share an interpreter); they share the
+# enriched data through the memory-mapped file like the server processes do.
+def run_level(concurrency, args):
+    context = multiprocessing.get_context('spawn')
+    ready, done = context.Barrier(concurrency + 1), context.Barrier(concurrency + 1)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=_session_process,
+            args=(args.seed + index, args.runs, args.timeout, ready, done, results)
+        )
+        for index in range(concurrency)
+    ]
+    for process in processes:
+        process.start()
+
+    ready.wait()
+    with _ResourceMonitor(processes) as monitor:
+        outcomes = [results.get() for _ in processes]
+    done.wait()
+    for process in processes:
+        process.join()
+
+    errors = [detail for status, detail in outcomes if status == 'error']
+    if errors:
+        raise RuntimeError(errors[0])
+    timings = [timing for _, session_timings in outcomes for timing in session_timings]
+
+    all_seconds = np.array([seconds for _, seconds in timings])
+    run_seconds = np.array([seconds for name, seconds in timings if name == 'run'])
+    p50, p95 = np.percentile(all_seconds, [50, 95]) * 1000
+    run_p50, run_p95 = np.percentile(run_seconds, [50, 95]) * 1000
+    return {
+        'sessions': concurrency,
+        'reruns': len(all_seconds),
+        'p50_ms': round(p50, 1),
+        'p95_ms': round(p95, 1),
+        'run_p50_ms': round(run_p50, 1),
+        'run_p95_ms': round(run_p95, 1),
+        'cpu_percent': round(monitor.cpu_percent, 1),
+        'peak_rss_mb': round(monitor.peak_rss / 2**20, 1),
+        'peak_pss_mb': round(monitor.peak_pss / 2**20, 1),
+        'wall_s': round(monitor.wall, 2),
+    }
+
+
+COLUMNS = [
+    'sessions', 'reruns', 'p50_ms', 'p95_ms', 'run_p50_ms', 'run_p95_ms',
+    'cpu_percent', 'peak_rss_mb', 'peak_pss_mb', 'wall_s',
+]
+
+
+def _print_table(rows, baseline=None):
+    print(' '.join(f'{column:>12}' for column in COLUMNS))
+    baseline = {row['sessions']: row for row in baseline or []}
+    for row in rows:
+        print(' '.join(f'{row[column]:>12}' for column in COLUMNS))
+        previous = baseline.get(row['sessions'])
+        if previous:
+            # Relative change against the baseline run (negative is faster/smaller)
+            changes = [
+                f"{100 * (row[column] / previous[column] - 1):+.0f}%" if previous.get(column) else ''
+                for column in COLUMNS[2:]
+            ]
+            print(' '.join(f'{value:>12}' for value in ['vs baseline', ''] + changes))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline concurrent-session load test for the dashboard')
+    parser.add_argument('--concurrency', default='1,2,4,8', help='comma separated session counts')
+    parser.add_argument('--runs', type=int, default=3, help='Run presses per session')
+    parser.add_argument('--data', help='local raw parquet to use instead of synthetic data')
+    parser.add_argument('--players', type=int, default=1000)
+    parser.add_argument('--weeks', type=int, default=20)
+    parser.add_argument('--seasons', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache-dir', help='directory for the enriched files (default: a new temp dir)')
+    parser.add_argument('--timeout', type=float, default=300, help='seconds allowed per rerun')
+    parser.add_argument('--output', help='write the results as JSON (to use as a baseline later)')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    args = parser.parse_args(argv)
+
+    _configure_environment(args)
+
+    # Warm up: the first session builds the enriched files, which is a one-off per host
+    warm_up = run_level(1, argparse.Namespace(**{**vars(args), 'runs': 1}))
+    print(f"warm-up session (builds the enriched data): {warm_up['wall_s']:.2f}s")
+
+    rows = [run_level(int(level), args) for level in args.concurrency.split(',')]
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    _print_table(rows, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
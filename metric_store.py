@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+
+# Compact in-memory representation of the metrics: one 2-D float32 block with a
+# name -> column index and group -> column slice views. The block is column-major
+# (Fortran order), so every column and every group slice is a contiguous view and
+# fills, rating fits and cumulative sums can work on it without copying sub-frames.
+class MetricStore:
+    def __init__(self, columns, n_rows, groups=None, dtype=np.float32):
+        self.columns = list(columns)
+        self.index = {name: position for position, name in enumerate(self.columns)}
+        self.values = np.full((n_rows, len(self.columns)), np.nan, dtype=dtype, order='F')
+
+        # Groups must be laid out next to each other so they can be sliced instead of gathered
+        self.slices = {}
+        for name, members in (groups or {}).items():
+            positions = sorted(self.index[member] for member in members)
+            if positions != list(range(positions[0], positions[0] + len(positions))):
+                raise ValueError(f"Columns of group '{name}' are not contiguous in the store layout")
+            self.slices[name] = slice(positions[0], positions[-1] + 1)
+
+        # Groups that went through the conditional NaN fill (see NumpyEngine.fill_store).
+        # In their columns every row is either complete or entirely missing.
+        self.filled = set()
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def column(self, name):
+        return self.values[:, self.index[name]]
+
+    def group(self, name):
+        return self.values[:, self.slices[name]]
+
+    def group_columns(self, name):
+        return self.columns[self.slices[name]]
+
+    # Whether all columns of the group lie inside one filled group, so a row of the group
+    # is either complete or entirely missing
+    def is_filled(self, name):
+        inner = self.slices[name]
+        return any(
+            self.slices[group].start <= inner.start and inner.stop <= self.slices[group].stop
+            for group in self.filled
+        )
+
+    # Wrap the block in a DataFrame without copying it (the frame's columns are views of the store)
+    def to_frame(self, suffix=''):
+        return pd.DataFrame(self.values, columns=[f'{name}{suffix}' for name in self.columns], copy=False)
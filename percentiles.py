@@ -0,0 +1,95 @@
+import numpy as np
+
+import enriched_store
+from rating_pipeline import (
+    METRICS_FOR_CUM_AVG,
+    POSITION_GROUPS,
+    find_position_column,
+    latest_player_rows,
+)
+
+# Number of quantiles stored per table (0, 1, ..., 100th percentile)
+PERCENTILE_QUANTILES = 101
+
+
+# Sorted quantile tables of the players' current season averages (their latest
+# cumulative averages) per (League, position group), one column per metric. The tables
+# are not per matchday: a season average up to an earlier matchday is placed among the
+# averages as of each player's latest match. Lookups are a vectorized binary search plus linear interpolation
+# between neighbouring quantiles, so no column has to be sorted at query time.
+class PercentileTables:
+    def __init__(self, metrics, references, quantiles):
+        self.metrics = list(metrics)
+        self.index = {metric: position for position, metric in enumerate(self.metrics)}
+        # Percentile (0-100) of every stored quantile row
+        self.references = references
+        # (League, position group) -> (n_quantiles, n_metrics) array, sorted along axis 0
+        self.quantiles = quantiles
+
+    def _table(self, league, position_group, metric):
+        table = self.quantiles.get((league, position_group))
+        if table is None or metric not in self.index:
+            return None
+        column = table[:, self.index[metric]]
+        if np.isnan(column[0]):
+            return None
+        return column
+
+    # Percentile (0-100) of each value among the group's current season averages. Values tied with
+    # several quantiles get the middle of them (like QuantileTransformer.transform).
+    def percentile(self, league, position_group, metric, values):
+        values = np.asarray(values, dtype=float)
+        column = self._table(league, position_group, metric)
+        if column is None:
+            return np.full(values.shape, np.nan)
+        lower = np.interp(values, column, self.references)
+        upper = -np.interp(-values, -column[::-1], -self.references[::-1])
+        return np.where(np.isnan(values), np.nan, 0.5 * (lower + upper))
+
+    # Season average at each percentile (0-100)
+    def value(self, league, position_group, metric, percentiles):
+        percentiles = np.asarray(percentiles, dtype=float)
+        column = self._table(league, position_group, metric)
+        if column is None:
+            return np.full(percentiles.shape, np.nan)
+        return np.interp(percentiles, self.references, column)
+
+
+# Compute the quantile tables from each player's latest cumulative averages per league
+# (np.nanquantile, the same estimate QuantileTransformer fits). A player counts for the
+# position group of the position in their latest row only, also when they played other
+# positions earlier in the season.
+def build_percentile_tables(data, metrics=METRICS_FOR_CUM_AVG, n_quantiles=PERCENTILE_QUANTILES):
+    position_column = find_position_column(data)
+    metrics = [metric for metric in metrics if f'{metric}_cum_avg' in data.columns]
+    latest = latest_player_rows(
+        data, ['player_id', 'League', 'Date', position_column] + [f'{metric}_cum_avg' for metric in metrics]
+    )
+    references = np.linspace(0, 1, n_quantiles)
+
+    quantiles = {}
+    for league, league_rows in latest.groupby('League', observed=True):
+        for group, positions in POSITION_GROUPS.items():
+            rows = league_rows[league_rows[position_column].isin(positions)]
+            if rows.empty:
+                continue
+
+            values = rows[[f'{metric}_cum_avg' for metric in metrics]].to_numpy(dtype=float)
+            table = np.full((n_quantiles, len(metrics)), np.nan)
+            # Metrics nobody in the group has a value for keep an all-NaN column
+            present = ~np.isnan(values).all(axis=0)
+            table[:, present] = np.nanquantile(values[:, present], references, axis=0)
+            # Guard against rounding making the quantiles non-monotonic
+            table[:, present] = np.maximum.accumulate(table[:, present], axis=0)
+            quantiles[(league, group)] = table
+
+    return PercentileTables(metrics, references * 100, quantiles)
+
+
+# Return the percentile tables of one season (built once per host, stored next to the
+# enriched partitions and loaded once per process)
+def load_or_build(data_version, season):
+    return enriched_store.load_or_build_artifact(
+        data_version, f'percentiles_{season}',
+        lambda: build_percentile_tables(enriched_store.open_season(data_version, season))
+    )
@@ -0,0 +1,79 @@
+import threading
+import time
+
+import enriched_store
+import percentiles
+import similarity
+import weekly_cube
+
+# Warm the shared caches in a background thread as soon as the server process runs the
+# app for the first time (the first login page), so the first scout after a deploy or
+# restart doesn't wait for the download, the rating fits and the derived structures.
+#
+# The thread builds the enriched dataset and, for the latest season (the one the page
+# opens with), the percentile tables, the similarity indexes and the weekly cube of every
+# league. Older seasons are still built on demand. Everything goes through the same
+# build-once files as the page, so a session that logs in while the thread is building
+# waits for that build instead of starting a second one. The cubes are only written, not
+# opened: a process maps a league's cube when one of its sessions asks for it.
+#
+# The thread must not call Streamlit: it has no script run context. It only updates the
+# status below, which the login page shows.
+
+_status = {'state': 'not started', 'detail': '', 'seconds': None, 'warnings': []}
+_status_lock = threading.Lock()
+_thread = None
+
+
+def _set_status(state, detail='', seconds=None):
+    with _status_lock:
+        _status.update(state=state, detail=detail, seconds=seconds)
+
+
+# Record a problem that didn't stop the warm-up (e.g. rows left out of the data)
+def warn(message):
+    with _status_lock:
+        _status['warnings'].append(message)
+
+
+# Current warm-up status: {'state': 'not started' | 'warming' | 'ready' | 'failed',
+# 'detail': progress or error message, 'seconds': duration once finished,
+# 'warnings': messages passed to warn()}
+def status():
+    with _status_lock:
+        return dict(_status, warnings=list(_status['warnings']))
+
+
+def _warm(data_version, build):
+    start = time.perf_counter()
+    try:
+        _set_status('warming', 'Downloading and rating the data')
+        partitions = enriched_store.load_or_build(data_version, build)
+        if not partitions:
+            raise RuntimeError('No data')
+
+        season = max(partitions)
+        _set_status('warming', f'Preparing percentiles and similar players ({season})')
+        percentiles.load_or_build(data_version, season)
+        similarity.load_or_build(data_version, season)
+        for league in partitions[season]:
+            _set_status('warming', f'Preparing matchday aggregates ({season}, {league})')
+            data = enriched_store.open_partition(data_version, season, league)
+            weekly_cube.build(data_version, season, league, data)
+    except Exception as e:
+        _set_status('failed', f'{type(e).__name__}: {e}', time.perf_counter() - start)
+    else:
+        _set_status('ready', seconds=time.perf_counter() - start)
+
+
+# Start the warm-up once per process (later calls do nothing). build() returns the
+# {(season, league): frame} partitions like for enriched_store.load_or_build, and must
+# raise instead of reporting errors through Streamlit.
+def start(data_version, build):
+    global _thread
+    with _status_lock:
+        if _thread is not None:
+            return
+        _status.update(state='warming', detail='Starting')
+        _thread = threading.Thread(target=_warm, args=(data_version, build), name='prewarm', daemon=True)
+        _thread.start()
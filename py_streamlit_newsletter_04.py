@@ -1,9 +1,21 @@
+import os
 import streamlit as st
 import pandas as pd
-from datetime import datetime
-from sklearn.preprocessing import MinMaxScaler, QuantileTransformer
 import gdown
-import numpy as np  # <-- We import NumPy for the log1p function
+
+import enriched_store
+import percentiles
+import prewarm
+import similarity
+import weekly_cube
+from rating_pipeline import (
+    POSITION_GROUPS,
+    enrich_partitioned,
+    find_position_column,
+    find_team_column,
+    get_engine,
+)
+from report import build_report, glossary_html, report_flights, section_html
 
 # Set the page configuration to wide mode
 st.set_page_config(layout="wide")
@@ -80,48 +92,189 @@ def set_mobile_css():
             visibility: visible;
             opacity: 1;
         }
+
+        /* Top 10 tables (rendered as plain HTML) */
+        .top-table {
+            overflow-x: auto;
+            margin-bottom: 1rem;
+        }
+
+        .top-table table {
+            border-collapse: collapse;
+            font-size: 14px;
+        }
+
+        .top-table th, .top-table td {
+            border: 1px solid #e6e6e6;
+            padding: 4px 8px;
+            text-align: left;
+            white-space: nowrap;
+        }
+
+        .top-table tr.young td {
+            background-color: #d4edda;
+        }
         </style>
         """,
         unsafe_allow_html=True
     )
 
-# Function to download and load the file from Google Drive
-@st.cache_data
-def download_and_load_data(file_url, data_version):
+# Pick the execution engine for the rating pipeline (pandas is the reference implementation,
+# numpy keeps the metrics in a compact float32 store)
+def select_engine(warn=st.warning):
+    try:
+        return get_engine(os.environ.get('RATING_ENGINE', 'numpy'))
+    except ImportError as e:
+        warn(f"{e} Falling back to the pandas engine.")
+        return get_engine('pandas')
+
+# Read the raw data from this local parquet file instead of Google Drive (offline runs
+# and load tests)
+LOCAL_DATA_PATH = os.environ.get('NEWSLETTER_DATA_PATH')
+
+# Download the file from Google Drive (unless a local file is configured) and return its path
+def download_data(file_url, data_version):
     # Define the file path for the downloaded parquet file
-    parquet_file = f'/tmp/newup1_{data_version}.parquet'
+    parquet_file = LOCAL_DATA_PATH or f'/tmp/newup1_{data_version}.parquet'
 
     # Download the file using gdown with fuzzy=True
-    try:
+    if not LOCAL_DATA_PATH:
         gdown.download(url=file_url, output=parquet_file, quiet=False, fuzzy=True)
+    return parquet_file
+
+# Load the parquet file using pandas
+def read_data(parquet_file):
+    data = pd.read_parquet(parquet_file)
+    data['DOB'] = pd.to_datetime(data['DOB'])
+    data['Date'] = pd.to_datetime(data['Date'])
+    return data
+
+# Function to download and load the file from Google Drive
+def download_and_load_data(file_url, data_version):
+    try:
+        parquet_file = download_data(file_url, data_version)
     except Exception as e:
         st.error(f"Error downloading file: {e}")
         return None
 
-    # Load the parquet file using pandas
     try:
-        data = pd.read_parquet(parquet_file)
-        data['DOB'] = pd.to_datetime(data['DOB'])
-        data['Date'] = pd.to_datetime(data['Date'])
-        return data
+        return read_data(parquet_file)
     except Exception as e:
         st.error(f"Error reading parquet file: {e}")
         return None
 
+# Download the raw data and run the rating pipeline on it season by season: numeric
+# coercion, conditional NaN fill, ratings and cumulative averages per player and league.
+# Returns one enriched frame per (Season, League).
+def build_enriched_data(file_url, data_version):
+    data = download_and_load_data(file_url, data_version)
+    if data is None:
+        return None
+
+    try:
+        return enrich_partitioned(select_engine(), data, warn=st.warning)
+    except KeyError as e:
+        st.error(e.args[0])
+        return None
+
+# Same as build_enriched_data for the prewarm thread, which can't use Streamlit: errors
+# are raised and warnings recorded (both shown with the warm-up status on the login page)
+def prewarm_enriched_data(file_url, data_version):
+    data = read_data(download_data(file_url, data_version))
+    return enrich_partitioned(select_engine(warn=lambda message: None), data, warn=prewarm.warn)
+
+# Load the enriched dataset. It is built once per data version and host, partitioned by
+# season and league, and returned as {season: [league, ...]}. Partitions are shared by
+# every server process and session through memory-mapped Arrow files (read-only!)
+def load_enriched_data(file_url, data_version):
+    with st.spinner("Preparing data..."):
+        return enriched_store.load_or_build(
+            data_version, lambda: build_enriched_data(file_url, data_version)
+        )
+
+# Load the similar-player indexes of one season (built once per data version and host,
+# stored next to the enriched partitions)
+def load_similarity_indexes(data_version, season):
+    with st.spinner("Preparing similar-player search..."):
+        return similarity.load_or_build(data_version, season)
+
+# Load the per-group percentile tables of one season (built once per data version and
+# host, stored next to the enriched partitions)
+def load_percentile_tables(data_version, season):
+    with st.spinner("Preparing percentiles..."):
+        return percentiles.load_or_build(data_version, season)
+
+# Load the weekly pre-aggregates of one (Season, League) partition (built once per data
+# version and host, stored next to the enriched partitions)
+def load_weekly_cube(data_version, season, league, data):
+    with st.spinner("Preparing matchday aggregates..."):
+        return weekly_cube.load_or_build(data_version, season, league, data)
+
+# Similar players of one player of the league. A fragment, so picking another player or
+# toggling the league filter reruns only this block, not the report above it.
+@st.fragment
+def show_similar_players(data_version, season, league, position_group, team_column):
+    index = load_similarity_indexes(data_version, season).get(position_group)
+    if index is None or not (index.players['League'] == league).any():
+        st.write("No data available")
+        return
+
+    league_players = index.players[index.players['League'] == league]
+    player_labels = {
+        player_id: f"{name} ({team})" if team_column else name
+        for player_id, name, team in zip(
+            league_players['player_id'],
+            league_players['playerFullName'],
+            league_players[team_column] if team_column else league_players['League']
+        )
+    }
+    similar_player = st.selectbox(
+        "Select Player", list(player_labels), format_func=player_labels.get, key="similar_player"
+    )
+    same_league = st.checkbox(f"Only players from {league}", value=True, key="similar_same_league")
+    similar = index.similar(similar_player, league if same_league else None)
+    heading = f"Players similar to {player_labels[similar_player]}"
+    content = similar if not similar.empty else "No data available"
+    st.markdown(section_html([(heading, content)]), unsafe_allow_html=True)
+
+# Show on the login page whether the shared caches are warm yet (see prewarm.py). While
+# polling, the first run after the warm-up ends reruns the page, which registers the
+# fragment again without run_every and so stops the polling.
+def show_warm_up_status(polling=False):
+    warm_up = prewarm.status()
+    if polling and warm_up['state'] not in ('not started', 'warming'):
+        st.rerun()
+    if warm_up['state'] == 'ready':
+        st.success(f"Data is ready (prepared in {warm_up['seconds']:.0f}s).")
+    elif warm_up['state'] == 'failed':
+        st.warning(f"Data could not be prepared in advance, it will be loaded after login. ({warm_up['detail']})")
+    else:
+        st.info(f"Preparing data: {warm_up['detail']}... You can already log in.")
+    for message in warm_up['warnings']:
+        st.warning(message)
+
+file_url = 'https://drive.google.com/uc?id=1S0z9gtDj0G7sSY1es7kMFZQVaDct8-st'
+data_version = 'v1'  # Update this to a new value when your data changes
+
+# Build the dataset and the latest season's caches in the background as soon as the
+# process serves its first page (once per process, later runs do nothing)
+prewarm.start(data_version, lambda: prewarm_enriched_data(file_url, data_version))
+
 # Ensure proper authentication
 if not st.session_state.authenticated:
     login()
+    # Refresh the status every few seconds while the warm-up is still running
+    warming = prewarm.status()['state'] in ('not started', 'warming')
+    st.fragment(show_warm_up_status, run_every=2 if warming else None)(warming)
 else:
     # User is authenticated
     st.write("Welcome! You are logged in.")
 
     # Load the dataset **only** after successful login
-    file_url = 'https://drive.google.com/uc?id=1S0z9gtDj0G7sSY1es7kMFZQVaDct8-st'
-    data_version = 'v1'  # Update this to a new value when your data changes
-    data = download_and_load_data(file_url, data_version)
+    partitions = load_enriched_data(file_url, data_version)
 
     # Check if the data was loaded successfully
-    if data is None:
+    if not partitions:
         st.error("Failed to load data")
         st.stop()
     else:
@@ -129,35 +282,6 @@ else:
         set_mobile_css()
         st.write("Data successfully loaded!")
 
-        # Define position groups with potential overlaps
-        position_groups = {
-            'IV': ['Left Centre Back', 'Right Centre Back', 'Central Defender'],
-            'AV': ['Left Back', 'Right Back'],
-            'FLV': ['Left Wing Back', 'Right Wing Back'],
-            'AVFLV': ['Left Back', 'Right Back', 'Left Wing Back', 'Right Wing Back'],
-            'ZDM': ['Defensive Midfielder'],
-            'ZDMZM': ['Defensive Midfielder', 'Central Midfielder'],
-            'ZM': ['Central Midfielder'],
-            'ZOM': ['Centre Attacking Midfielder'],
-            'ZMZOM': ['Central Midfielder', 'Centre Attacking Midfielder'],
-            'FS': ['Left Midfielder', 'Right Midfielder', 'Left Attacking Midfielder', 'Right Attacking Midfielder'],
-            'ST': ['Left Winger', 'Right Winger', 'Second Striker', 'Centre Forward']
-        }
-
-        # Based on the data columns, set the correct position column name
-        if 'Position_x' in data.columns:
-            position_column = 'Position_x'
-        elif 'Position' in data.columns:
-            position_column = 'Position'
-        else:
-            st.error("Position column not found in the data.")
-            st.stop()
-
-        # Assign positions to multiple groups
-        data['Position Groups'] = data[position_column].apply(
-            lambda pos: [group for group, positions in position_groups.items() if pos in positions]
-        )
-
         # Initialize session state for 'run_clicked'
         if 'run_clicked' not in st.session_state:
             st.session_state['run_clicked'] = False
@@ -173,17 +297,32 @@ else:
 
         # Create a single row for all the filters
         with st.container():
-            col1, col2, col3 = st.columns([1, 1, 1])
+            col0, col1, col2, col3 = st.columns([1, 1, 1, 1])
+
+            with col0:
+                seasons = sorted(partitions, reverse=True)  # Latest season first
+                selected_season = st.selectbox("Select Season", seasons, key="select_season", on_change=reset_run)
 
             with col1:
-                leagues = sorted(data['League'].unique())  # Sort leagues alphabetically
+                leagues = partitions[selected_season]  # Sorted alphabetically
                 selected_league = st.selectbox("Select League", leagues, key="select_league", on_change=reset_run)
 
+            # Only the selected season and league are read (one memory-mapped partition)
+            data = enriched_store.open_partition(data_version, selected_season, selected_league)
+
+            # Based on the data columns, set the correct position column name
+            position_column = find_position_column(data)
+            if position_column is None:
+                st.error("Position column not found in the data.")
+                st.stop()
+
             with col2:
-                league_data = data[data['League'] == selected_league]
+                # Only the columns the matchday list needs (masking the whole partition would
+                # copy every column on each rerun)
+                league_data = data.loc[data['League'] == selected_league, ['League', 'Week', 'Date']]
 
                 # Week Summary and Matchday Filtering Logic
-                week_summary = league_data.groupby(['League', 'Week']).agg({'Date': ['min', 'max']}).reset_index()
+                week_summary = league_data.groupby(['League', 'Week'], observed=True).agg({'Date': ['min', 'max']}).reset_index()
                 week_summary.columns = ['League', 'Week', 'min', 'max']
 
                 week_summary['min'] = pd.to_datetime(week_summary['min'])
@@ -240,7 +379,7 @@ else:
                 last_selected_date = max(selected_dates)
 
             with col3:
-                position_group_options = list(position_groups.keys())
+                position_group_options = list(POSITION_GROUPS.keys())
                 selected_position_group = st.selectbox(
                     "Select Position Group",
                     position_group_options,
@@ -253,777 +392,46 @@ else:
 
         # Process data only if "Run" has been clicked
         if st.session_state['run_clicked']:
-            # Glossary content with metrics integrated
-            glossary = {
-                'Ratings': 'A collection of aggregated performance metrics.',
-                'Overall Rating': 'Player\'s overall performance across all metrics.',
-                'Defensive Rating': 'Player\'s overall defensive performance. Metrics include various defensive actions.',
-                'Goal Threat Rating': 'Player\'s threat to score goals. Metrics include shots, expected goals, etc.',
-                'Offensive Rating': 'Player\'s overall offensive performance. Metrics include assists, key passes, etc.',
-                'Physical Offensive Rating': 'Player\'s physical contributions to offensive play.',
-                'Physical Defensive Rating': 'Player\'s physical contributions to defensive play.',
-                'Pass Rating': 'Player\'s overall passing performance. Metrics include pass attempts, completion, key passes, through balls, etc.',
-                'Activity Rating': 'Player\'s involvement in moves, receiving passes, and touches in advanced areas. (Touches, TouchOpBox, PsRec)',
-                'Ballcarrier Rating': 'Player\'s ability to carry the ball forward and beat opponents. (TakeOn, Success1v1, Take on into the Box, ProgCarry)',
-                'Min': 'Minutes played in the selected matchday(s) (total minutes played across all matchdays)',
-                # Physical Metrics
-                'PSV-99': 'Player\'s physical performance score compared to peers.',
-                'Distance': 'Total distance covered by the player.',
-                'M/min': 'Meters covered per minute.',
-                'HSR Distance': 'High-speed running distance.',
-                'HSR Count': 'Number of high-speed runs.',
-                'Sprint Distance': 'Total sprint distance.',
-                'Sprint Count': 'Number of sprints.',
-                'HI Distance': 'High-intensity running distance.',
-                'HI Count': 'Number of high-intensity runs.',
-                'Medium Acceleration Count': 'Number of medium accelerations.',
-                'High Acceleration Count': 'Number of high accelerations.',
-                'Medium Deceleration Count': 'Number of medium decelerations.',
-                'High Deceleration Count': 'Number of high decelerations.',
-                'Distance OTIP': 'Distance covered out of team possession.',
-                'M/min OTIP': 'Meters per minute out of team possession.',
-                'HSR Distance OTIP': 'High-speed running distance out of team possession.',
-                'HSR Count OTIP': 'High-speed run count out of team possession.',
-                'Sprint Distance OTIP': 'Sprint distance out of team possession.',
-                'Sprint Count OTIP': 'Sprint count out of team possession.',
-                'HI Distance OTIP': 'High-intensity distance out of team possession.',
-                'HI Count OTIP': 'High-intensity count out of team possession.',
-                'Medium Acceleration Count OTIP': 'Medium accelerations out of team possession.',
-                'High Acceleration Count OTIP': 'High accelerations out of team possession.',
-                'Medium Deceleration Count OTIP': 'Medium decelerations out of team possession.',
-                'High Deceleration Count OTIP': 'High decelerations out of team possession.',
-                # Offensive Metrics
-                '2ndAst': 'Secondary assists.',
-                'Ast': 'Assists.',
-                'ExpG': 'Expected goals.',
-                'ExpGExPn': 'Expected goals excluding penalties.',
-                'Goal': 'Goals scored.',
-                'GoalExPn': 'Goals excluding penalties.',
-                'KeyPass': 'Passes leading directly to a shot.',
-                'MinPerChnc': 'Minutes per chance created.',
-                'MinPerGoal': 'Minutes per goal scored.',
-                'PsAtt': 'Passes attempted.',
-                'PsCmp': 'Passes completed.',
-                'Pass%': 'Pass completion percentage.',
-                'PsIntoA3rd': 'Passes into the attacking third.',
-                'PsRec': 'Passes received.',
-                'ProgCarry': 'Progressive carries.',
-                'ProgPass': 'Progressive passes.',
-                'Shot': 'Shots taken.',
-                'Shot conversion': 'Percentage of shots resulting in goals.',
-                'Shot/Goal': 'Shots per goal.',
-                'SOG': 'Shots on goal.',
-                'OnTarget%': 'Percentage of shots on target.',
-                'Success1v1': 'Successful one-on-one take-ons.',
-                'Take on into the Box': 'Take-ons into the penalty box.',
-                'TakeOn': 'Total take-ons attempted.',
-                'ThrghBalls': 'Through balls.',
-                'TouchOpBox': 'Touches in the opposition box.',
-                'Touches': 'Total touches.',
-                'xA': 'Expected assists.',
-                'xA +/-': 'Expected assists above or below average.',
-                'xG +/-': 'Expected goals above or below average.',
-                'xGOT': 'Expected goals on target.',
-                # Defensive Metrics
-                'AdjInt': 'Adjusted interceptions.',
-                'AdjTckl': 'Adjusted tackles.',
-                'Blocks': 'Blocks made.',
-                'Clrnce': 'Clearances.',
-                'Int': 'Interceptions.',
-                'TcklAtt': 'Tackle attempts.',
-                'Tckl': 'Tackles made.',
-                'TcklMade%': 'Percentage of successful tackles.',
-                'TcklA3': 'Tackles in the attacking third.',
-                # Percentage Metrics
-                'OnTarget%': 'Percentage of shots on target.',
-                'Pass%': 'Pass completion percentage.',
-                'TcklMade%': 'Percentage of tackles made successfully.',
-            }
-
-            # Perform data processing steps here
-            # Calculate age from birthdate
-            data['DOB'] = pd.to_datetime(data['DOB'])
-            today = datetime.today()
-            data['Age'] = data['DOB'].apply(
-                lambda x: today.year - x.year - ((today.month, today.day) < (x.month, x.day))
-            )
+            # Pick the execution engine for the per-player aggregations
+            engine = select_engine()
 
-            # Ensure 'Date' is in datetime format
-            data['Date'] = pd.to_datetime(data['Date'])
-
-            # Convert text-based numbers to numeric, handling percentage metrics
-            percentage_metrics = ['TcklMade%', 'Pass%', 'OnTarget%']
-
-            # Remove percentage signs and convert to numeric
-            for metric in percentage_metrics:
-                if metric in data.columns:
-                    data[metric] = pd.to_numeric(
-                        data[metric].astype(str).str.replace('%', ''),
-                        errors='coerce'
-                    )
-
-            # Define the main metric groups
-            physical_metrics = [
-                'PSV-99', 'Distance', 'M/min', 'HSR Distance', 'HSR Count', 'Sprint Distance',
-                'Sprint Count', 'HI Distance', 'HI Count', 'Medium Acceleration Count',
-                'High Acceleration Count', 'Medium Deceleration Count', 'High Deceleration Count',
-                'Distance OTIP', 'M/min OTIP', 'HSR Distance OTIP', 'HSR Count OTIP',
-                'Sprint Distance OTIP', 'Sprint Count OTIP', 'HI Distance OTIP', 'HI Count OTIP',
-                'Medium Acceleration Count OTIP', 'High Acceleration Count OTIP',
-                'Medium Deceleration Count OTIP', 'High Deceleration Count OTIP'
-            ]
-
-            offensive_metrics = [
-                '2ndAst', 'Ast', 'ExpG', 'ExpGExPn', 'Goal', 'GoalExPn', 'KeyPass',
-                'MinPerChnc', 'MinPerGoal', 'PsAtt', 'PsCmp', 'Pass%', 'PsIntoA3rd',
-                'PsRec', 'ProgCarry', 'ProgPass', 'Shot', 'Shot conversion',
-                'Shot/Goal', 'SOG', 'OnTarget%', 'Success1v1', 'Take on into the Box',
-                'TakeOn', 'ThrghBalls', 'TouchOpBox', 'Touches', 'xA',
-                'xA +/-', 'xG +/-', 'xGOT'
-            ]
-
-            defensive_metrics = [
-                'TcklMade%', 'TcklAtt', 'Tckl', 'AdjTckl', 'TcklA3', 'Blocks', 'Int', 'AdjInt', 'Clrnce'
-            ]
-
-            goal_threat_metrics = [
-                'Goal', 'Shot/Goal', 'MinPerGoal', 'ExpG', 'xGOT', 'xG +/-',
-                'Shot', 'SOG', 'Shot conversion', 'OnTarget%'
-            ]
-
-            # NEW: Activity & Ballcarrier metric groups
-            activity_metrics = ['Touches', 'TouchOpBox', 'PsRec']
-            ballcarrier_metrics = ['TakeOn', 'Success1v1', 'Take on into the Box', 'ProgCarry']
-
-            # Combine all metrics for processing
-            all_metrics = list(set(
-                physical_metrics
-                + offensive_metrics
-                + defensive_metrics
-                + goal_threat_metrics
-                + percentage_metrics
-                + activity_metrics
-                + ballcarrier_metrics
-            ))
-
-            # Convert numeric columns (excluding the already handled percentages)
-            for metric in all_metrics:
-                if metric in data.columns and metric not in percentage_metrics:
-                    data[metric] = pd.to_numeric(
-                        data[metric].astype(str).str.replace(',', '.'),
-                        errors='coerce'
-                    )
-
-            # Ensure 'Min' column is numeric
-            if 'Min' in data.columns:
-                data['Min'] = pd.to_numeric(data['Min'], errors='coerce')
-            else:
-                st.error("Column 'Min' not found in data.")
-                st.stop()
-
-            # Fill NaN values with 0 only for players who have any non-NaN value in the group of metrics
-            def fill_na_conditionally(df, metric_group):
-                # Create a mask where any metric in the group is not NaN
-                mask = df[metric_group].notna().any(axis=1)
-                # Apply filling only to rows where the mask is True
-                df.loc[mask, metric_group] = df.loc[mask, metric_group].fillna(0)
-
-            fill_na_conditionally(data, physical_metrics)
-            fill_na_conditionally(data, offensive_metrics)
-            fill_na_conditionally(data, defensive_metrics)
-            fill_na_conditionally(data, goal_threat_metrics)
-            fill_na_conditionally(data, activity_metrics)
-            fill_na_conditionally(data, ballcarrier_metrics)
-
-            # Initialize the scalers
-            scaler = MinMaxScaler(feature_range=(0, 10))
-            quantile_transformer = QuantileTransformer(output_distribution='uniform', random_state=0)
-
-            # Define physical metrics subsets
-            physical_offensive_metrics = [
-                'PSV-99', 'Distance', 'M/min', 'HSR Distance', 'HSR Count', 'Sprint Distance',
-                'Sprint Count', 'HI Distance', 'HI Count',
-                'Medium Acceleration Count', 'High Acceleration Count',
-                'Medium Deceleration Count', 'High Deceleration Count'
-            ]
-
-            physical_defensive_metrics = [
-                'Distance OTIP', 'M/min OTIP', 'HSR Distance OTIP', 'HSR Count OTIP',
-                'Sprint Distance OTIP', 'Sprint Count OTIP', 'HI Distance OTIP',
-                'HI Count OTIP', 'Medium Acceleration Count OTIP',
-                'High Acceleration Count OTIP', 'Medium Deceleration Count OTIP',
-                'High Deceleration Count OTIP'
-            ]
-
-            # Define pass metrics (with weighting logic already in place before log transform)
-            pass_metrics = [
-                'PsAtt', 'PsCmp', 'Pass%', 'PsIntoA3rd', 'KeyPass', 'ThrghBalls'
-            ]
-            weights = {
-                'PsAtt': 1.0,
-                'PsCmp': 1.0,
-                'Pass%': 1.0,
-                'PsIntoA3rd': 2.0,
-                'KeyPass': 2.0,
-                'ThrghBalls': 2.0
-            }
-
-            # --- Calculate the Ratings ---
-
-            # 1) Physical Offensive Rating
-            data['Physical Offensive Rating'] = (
-                scaler.fit_transform(
-                    quantile_transformer.fit_transform(data[physical_offensive_metrics].fillna(0))
-                ).mean(axis=1)
-            )
-
-            # 2) Physical Defensive Rating
-            data['Physical Defensive Rating'] = (
-                scaler.fit_transform(
-                    quantile_transformer.fit_transform(data[physical_defensive_metrics].fillna(0))
-                ).mean(axis=1)
-            )
-
-            # 3) Offensive Rating
-            data['Offensive Rating'] = (
-                scaler.fit_transform(
-                    quantile_transformer.fit_transform(data[offensive_metrics].fillna(0))
-                ).mean(axis=1)
-            )
-
-            # 4) Defensive Rating
-            data['Defensive Rating'] = (
-                scaler.fit_transform(
-                    quantile_transformer.fit_transform(data[defensive_metrics].fillna(0))
-                ).mean(axis=1)
-            )
-
-            # 5) Goal Threat Rating
-            data['Goal Threat Rating'] = (
-                scaler.fit_transform(
-                    quantile_transformer.fit_transform(data[goal_threat_metrics].fillna(0))
-                ).mean(axis=1)
-            )
-
-            # 6) Pass Rating with LOG TRANSFORM + weighting **before** log
-            pass_subset = data[pass_metrics].fillna(0).copy()
-            for col in pass_metrics:
-                pass_subset[col] = pass_subset[col] * weights[col]
-
-            pass_logged = np.log1p(pass_subset)
-            pass_transformed = quantile_transformer.fit_transform(pass_logged)
-            pass_scaled = scaler.fit_transform(pass_transformed)
-            data['Pass Rating'] = pass_scaled.mean(axis=1)
-
-            # 7) Activity Rating (no log, no extra weighting)
-            data['Activity Rating'] = (
-                scaler.fit_transform(
-                    quantile_transformer.fit_transform(data[activity_metrics].fillna(0))
-                ).mean(axis=1)
-            )
-
-            # 8) Ballcarrier Rating (no log, no extra weighting)
-            data['Ballcarrier Rating'] = (
-                scaler.fit_transform(
-                    quantile_transformer.fit_transform(data[ballcarrier_metrics].fillna(0))
-                ).mean(axis=1)
-            )
+            # Identify the team column globally
+            team_column = find_team_column(data)
+            if team_column is None:
+                st.warning("Team column not found in data.")
 
-            # Gather all rating columns
-            rating_metrics = [
-                'Overall Rating',
-                'Physical Offensive Rating',
-                'Physical Defensive Rating',
-                'Offensive Rating',
-                'Defensive Rating',
-                'Goal Threat Rating',
-                'Pass Rating',
-                'Activity Rating',
-                'Ballcarrier Rating'
-            ]
-
-            # Calculate Overall Rating (including Pass Rating). 
-            # NOTE: If you want to include the new ratings in Overall Rating, add them here.
-            data['Overall Rating'] = data[[
-                'Physical Offensive Rating',
-                'Physical Defensive Rating',
-                'Offensive Rating',
-                'Defensive Rating',
-                'Goal Threat Rating',
-                'Pass Rating'
-            ]].mean(axis=1)
-
-            # Sort data
-            data = data.sort_values(['League', 'playerFullName', 'Date'])
-
-            # Create a list of metrics for which we want cumulative averages
-            metrics_for_cum_avg = (
-                rating_metrics
-                + physical_offensive_metrics
-                + physical_defensive_metrics
-                + offensive_metrics
-                + defensive_metrics
-                + activity_metrics
-                + ballcarrier_metrics
+            # Compute all tables first, then send every expander as a single HTML element
+            # (one message per section instead of a header and a table per metric).
+            # Identical Runs of other sessions in progress are joined instead of repeated, and
+            # the last report is kept in the session so reruns with the same filters reuse it.
+            selection = (
+                data_version, selected_season, selected_league, tuple(sorted(selected_weeks)), selected_position_group
             )
-            metrics_for_cum_avg = list(set(metrics_for_cum_avg))
-
-            # Calculate cumulative averages for each player in each league
-            for metric in metrics_for_cum_avg:
-                data[f'{metric}_cum_avg'] = (
-                    data
-                    .groupby(['League', 'playerFullName'])[metric]
-                    .expanding()
-                    .mean()
-                    .reset_index(level=[0, 1], drop=True)
+            if st.session_state.get('report_selection') != selection:
+                st.session_state['report'] = report_flights.run(
+                    selection, build_report,
+                    engine, data, selected_league, selected_weeks, selected_position_group,
+                    team_column, position_column, load_percentile_tables(data_version, selected_season),
+                    load_weekly_cube(data_version, selected_season, selected_league, data)
                 )
-
-            # Filter data by the selected position group and the selected matchdays
-            league_and_position_data = data[
-                (data['League'] == selected_league)
-                & (data['Week'].isin(selected_weeks))
-                & (data['Position Groups'].apply(lambda groups: selected_position_group in groups))
-            ]
-
-            # Data filtered by League and Position Group only (all matchdays)
-            league_position_all_data = data[
-                (data['League'] == selected_league)
-                & (data['Position Groups'].apply(lambda groups: selected_position_group in groups))
-            ]
-
-            # Identify the team column globally
-            if 'Team' in data.columns:
-                team_column = 'Team'
-            elif 'Team_x' in data.columns:
-                team_column = 'Team_x'
-            elif 'Squad' in data.columns:
-                team_column = 'Squad'
-            else:
-                st.warning("Team column not found in data.")
-                team_column = None
-
-            # Define metrics that are counts and should be summed
-            count_metrics = [
-                'Goal', 'Ast', 'KeyPass', 'Shot', 'SOG', 'TakeOn', 'Success1v1', 'Blocks', 'Int', 'Clrnce',
-                'Tckl', 'AdjTckl', 'TcklAtt', 'AdjInt', 'TcklA3', 'ThrghBalls', 'TouchOpBox', 'Touches',
-                'Take on into the Box', '2ndAst', 'PsAtt', 'PsCmp', 'PsIntoA3rd', 'PsRec', 'ProgCarry', 'ProgPass',
-                'Shot conversion', 'Shot/Goal', 'HI Count', 'HI Count OTIP', 'Medium Acceleration Count',
-                'Medium Acceleration Count OTIP', 'Medium Deceleration Count', 'Medium Deceleration Count OTIP',
-                'High Acceleration Count', 'High Acceleration Count OTIP', 'High Deceleration Count',
-                'High Deceleration Count OTIP', 'HSR Count', 'HSR Count OTIP', 'Sprint Count', 'Sprint Count OTIP'
-            ]
-
-            # Define metrics that should be averaged
-            average_metrics = [
-                'Pass%', 'OnTarget%', 'TcklMade%', 'ExpG', 'ExpGExPn', 'xA', 'xG +/-', 'xA +/-', 'xGOT',
-                'MinPerGoal', 'MinPerChnc', 'PSV-99', 'Distance', 'Distance OTIP', 'M/min', 'M/min OTIP', 'HI Distance',
-                'HI Distance OTIP', 'HSR Distance', 'HSR Distance OTIP', 'Sprint Distance', 'Sprint Distance OTIP'
-            ] + rating_metrics
-
-            # Collect Mentions Over All Matchdays
-            all_weeks = league_position_all_data['Week'].unique()
-            mentions_dict = {}
-            rating_metrics_to_collect = [
-                'Overall Rating',
-                'Offensive Rating',
-                'Goal Threat Rating',
-                'Pass Rating',
-                'Activity Rating',
-                'Ballcarrier Rating',
-                'Defensive Rating',
-                'Physical Offensive Rating',
-                'Physical Defensive Rating'
-            ]
-
-            for week in all_weeks:
-                week_data = league_position_all_data[league_position_all_data['Week'] == week]
-
-                for metric in rating_metrics_to_collect:
-                    if metric not in data.columns:
-                        continue
-
-                    if metric in count_metrics:
-                        agg_func = 'sum'
-                    elif metric in average_metrics or metric in percentage_metrics:
-                        agg_func = 'mean'
-                    else:
-                        agg_func = 'mean'
-
-                    agg_dict = {'Age': 'last', metric: agg_func, 'Min': 'sum'}
-
-                    if team_column:
-                        agg_dict[team_column] = 'last'
-
-                    if position_column in week_data.columns:
-                        agg_dict[position_column] = 'last'
-
-                    try:
-                        aggregated_data = week_data.groupby('playerFullName').agg(agg_dict).reset_index()
-                    except KeyError as e:
-                        st.error(f"Column not found during aggregation for mentions: {e}")
-                        continue
-
-                    top10 = aggregated_data.dropna(subset=[metric]).sort_values(by=metric, ascending=False).head(10)
-
-                    for _, row in top10.iterrows():
-                        player = row['playerFullName']
-                        if player not in mentions_dict:
-                            mentions_dict[player] = {
-                                'Player': player,
-                                'Age': row['Age'],
-                                'Team': row.get(team_column, ''),
-                                'Position': row.get(position_column, ''),
-                                'Total Mentions': 0
-                            }
-                            for m in rating_metrics_to_collect:
-                                mentions_dict[player][m] = 0
-                        mentions_dict[player]['Total Mentions'] += 1
-                        mentions_dict[player][metric] += 1
+                st.session_state['report_selection'] = selection
+            report = st.session_state['report']
 
             with st.container():
-                tooltip_headers = {
-                    metric: glossary.get(metric, '')
-                    for metric in rating_metrics
-                    + physical_metrics
-                    + offensive_metrics
-                    + defensive_metrics
-                    + activity_metrics
-                    + ballcarrier_metrics
-                }
-
-                # Ratings Section
-                with st.expander("Ratings", expanded=False):
-                    for metric in rating_metrics_to_collect:
-                        if metric not in data.columns:
-                            continue
-
-                        metric_data = league_and_position_data
-
-                        if metric in count_metrics:
-                            agg_func = 'sum'
-                        elif metric in average_metrics or metric in percentage_metrics:
-                            agg_func = 'mean'
-                        else:
-                            agg_func = 'mean'
-
-                        agg_dict = {
-                            'Age': 'last',
-                            metric: agg_func,
-                            f'{metric}_cum_avg': 'last',
-                            'Min': 'sum'
-                        }
-
-                        if team_column:
-                            agg_dict[team_column] = 'last'
-
-                        if position_column in metric_data.columns:
-                            agg_dict[position_column] = 'last'
-
-                        try:
-                            latest_data = metric_data.groupby('playerFullName').agg(agg_dict).reset_index()
-                        except KeyError as e:
-                            st.error(f"Column not found during aggregation: {e}")
-                            continue
-
-                        latest_data['Age'] = latest_data['Age'].round(0).astype(int)
-
-                        minutes_total = data.groupby('playerFullName')['Min'].sum().reset_index()
-                        minutes_total.rename(columns={'Min': 'Min_Total'}, inplace=True)
-
-                        latest_data = latest_data.merge(minutes_total, on='playerFullName', how='left')
-                        latest_data['Min'] = latest_data.apply(
-                            lambda row: f"{int(row['Min'])} ({int(row['Min_Total'])})",
-                            axis=1
-                        )
-
-                        columns_to_select = [
-                            'playerFullName',
-                            'Age',
-                            team_column,
-                            position_column,
-                            'Min',
-                            metric,
-                            f'{metric}_cum_avg'
-                        ]
-                        available_columns = [col for col in columns_to_select if col in latest_data.columns]
-                        top10 = (
-                            latest_data[available_columns]
-                            .dropna(subset=[metric])
-                            .sort_values(by=metric, ascending=False)
-                            .head(10)
-                        )
-
-                        if top10.empty:
-                            st.markdown(f"<h2>{metric}</h2>", unsafe_allow_html=True)
-                            st.write("No data available")
-                            continue
-
-                        top10.reset_index(drop=True, inplace=True)
-                        top10['Rank'] = top10.index + 1
-                        cols = ['Rank'] + [col for col in top10.columns if col != 'Rank']
-                        top10 = top10[cols]
-                        top10.set_index('Rank', inplace=True)
-                        top10.rename(columns={'playerFullName': 'Player', position_column: 'Position'}, inplace=True)
-
-                        if team_column:
-                            top10.rename(columns={team_column: 'Team'}, inplace=True)
-
-                        top10[metric] = top10.apply(
-                            lambda row: f"{row[metric]:.2f} ({row[f'{metric}_cum_avg']:.2f})"
-                            if pd.notnull(row[f'{metric}_cum_avg']) else f"{row[metric]:.2f}",
-                            axis=1
-                        )
-                        top10.drop(columns=[f'{metric}_cum_avg'], inplace=True)
-                        cols = ['Player', 'Age', 'Team', 'Position', 'Min', metric]
-                        top10 = top10[cols]
-
-                        st.markdown(f"<h2>{metric}</h2>", unsafe_allow_html=True)
-
-                        def color_row(row):
-                            if row['Age'] < 24:
-                                return ['background-color: #d4edda'] * len(row)
-                            else:
-                                return [''] * len(row)
-
-                        top10_styled = top10.style.apply(color_row, axis=1)
-                        st.dataframe(top10_styled)
-
-                    if mentions_dict:
-                        mentions_df = pd.DataFrame.from_dict(mentions_dict, orient='index')
-                        cols = ['Player', 'Age', 'Team', 'Position', 'Total Mentions'] + rating_metrics_to_collect
-                        mentions_df = mentions_df[cols]
-                        mentions_df['Age'] = mentions_df['Age'].round(0).astype(int)
-                        mentions_df = mentions_df.sort_values(by='Total Mentions', ascending=False)
-                        mentions_df.reset_index(drop=True, inplace=True)
-                        mentions_df['Rank'] = mentions_df.index + 1
-                        mentions_df.set_index('Rank', inplace=True)
-                        st.markdown("<h2>Most Mentioned Players</h2>", unsafe_allow_html=True)
-
-                        def color_row(row):
-                            if row['Age'] < 24:
-                                return ['background-color: #d4edda'] * len(row)
-                            else:
-                                return [''] * len(row)
-
-                        mentions_styled = mentions_df.style.apply(color_row, axis=1)
-                        st.dataframe(mentions_styled)
-
-                # Function to display other metric tables (including PSV-99 overall top 10)
-                def display_metric_tables(metrics_list, title):
+                for title, blocks in report.items():
                     with st.expander(title, expanded=False):
-                        for metric in metrics_list:
-                            if metric not in data.columns:
-                                st.write(f"Metric {metric} not found in the data")
-                                continue
-
-                            metric_data = league_and_position_data
-
-                            if metric in count_metrics:
-                                agg_func = 'sum'
-                            elif metric in average_metrics or metric in percentage_metrics:
-                                agg_func = 'mean'
-                            else:
-                                agg_func = 'mean'
-
-                            agg_dict = {
-                                'Age': 'last',
-                                metric: agg_func,
-                                f'{metric}_cum_avg': 'last',
-                                'Min': 'sum'
-                            }
-
-                            if team_column:
-                                agg_dict[team_column] = 'last'
-
-                            if position_column in metric_data.columns:
-                                agg_dict[position_column] = 'last'
-
-                            try:
-                                latest_data = metric_data.groupby('playerFullName').agg(agg_dict).reset_index()
-                            except KeyError as e:
-                                st.error(f"Column not found during aggregation: {e}")
-                                continue
-
-                            latest_data['Age'] = latest_data['Age'].round(0).astype(int)
-
-                            minutes_total = data.groupby('playerFullName')['Min'].sum().reset_index()
-                            minutes_total.rename(columns={'Min': 'Min_Total'}, inplace=True)
-                            latest_data = latest_data.merge(minutes_total, on='playerFullName', how='left')
-                            latest_data['Min'] = latest_data.apply(
-                                lambda row: f"{int(row['Min'])} ({int(row['Min_Total'])})",
-                                axis=1
-                            )
-
-                            columns_to_select = [
-                                'playerFullName', 'Age', team_column, position_column,
-                                'Min', metric, f'{metric}_cum_avg'
-                            ]
-                            available_columns = [col for col in columns_to_select if col in latest_data.columns]
-                            top10 = (
-                                latest_data[available_columns]
-                                .dropna(subset=[metric])
-                                .sort_values(by=metric, ascending=False)
-                                .head(10)
-                            )
-
-                            st.markdown(f"<h2>{metric}</h2>", unsafe_allow_html=True)
-
-                            if top10.empty:
-                                st.write("No data available")
-                            else:
-                                top10.reset_index(drop=True, inplace=True)
-                                top10['Rank'] = top10.index + 1
-                                cols = ['Rank'] + [col for col in top10.columns if col != 'Rank']
-                                top10 = top10[cols]
-                                top10.set_index('Rank', inplace=True)
-                                top10.rename(columns={'playerFullName': 'Player', position_column: 'Position'}, inplace=True)
-
-                                if team_column:
-                                    top10.rename(columns={team_column: 'Team'}, inplace=True)
-
-                                top10[metric] = top10.apply(
-                                    lambda row: f"{row[metric]:.2f} ({row[f'{metric}_cum_avg']:.2f})"
-                                    if pd.notnull(row[f'{metric}_cum_avg']) else f"{row[metric]:.2f}",
-                                    axis=1
-                                )
-                                top10.drop(columns=[f'{metric}_cum_avg'], inplace=True)
-                                cols = ['Player', 'Age', 'Team', 'Position', 'Min', metric]
-                                top10 = top10[cols]
-
-                                def color_row(row):
-                                    if row['Age'] < 24:
-                                        return ['background-color: #d4edda'] * len(row)
-                                    else:
-                                        return [''] * len(row)
-
-                                top10_styled = top10.style.apply(color_row, axis=1)
-                                st.dataframe(top10_styled)
-
-                            # If the metric is 'PSV-99', also display the overall top 10 (ignoring position group)
-                            if metric == 'PSV-99':
-                                metric_data_overall = data[
-                                    (data['League'] == selected_league)
-                                    & (data['Week'].isin(selected_weeks))
-                                ]
-
-                                agg_dict_overall = {
-                                    'Age': 'last',
-                                    metric: agg_func,
-                                    f'{metric}_cum_avg': 'last',
-                                    'Min': 'sum'
-                                }
-                                if team_column:
-                                    agg_dict_overall[team_column] = 'last'
-                                if position_column in metric_data_overall.columns:
-                                    agg_dict_overall[position_column] = 'last'
-
-                                try:
-                                    latest_data_overall = metric_data_overall.groupby('playerFullName').agg(agg_dict_overall).reset_index()
-                                except KeyError as e:
-                                    st.error(f"Column not found during aggregation: {e}")
-                                    continue
-
-                                latest_data_overall['Age'] = latest_data_overall['Age'].round(0).astype(int)
-                                minutes_total_overall = data.groupby('playerFullName')['Min'].sum().reset_index()
-                                minutes_total_overall.rename(columns={'Min': 'Min_Total'}, inplace=True)
-                                latest_data_overall = latest_data_overall.merge(minutes_total_overall, on='playerFullName', how='left')
-                                latest_data_overall['Min'] = latest_data_overall.apply(
-                                    lambda row: f"{int(row['Min'])} ({int(row['Min_Total'])})",
-                                    axis=1
-                                )
-
-                                columns_to_select_overall = [
-                                    'playerFullName', 'Age', team_column, position_column,
-                                    'Min', metric, f'{metric}_cum_avg'
-                                ]
-                                available_columns_overall = [
-                                    col for col in columns_to_select_overall if col in latest_data_overall.columns
-                                ]
-                                top10_overall = (
-                                    latest_data_overall[available_columns_overall]
-                                    .dropna(subset=[metric])
-                                    .sort_values(by=metric, ascending=False)
-                                    .head(10)
-                                )
-
-                                if not top10_overall.empty:
-                                    top10_overall.reset_index(drop=True, inplace=True)
-                                    top10_overall['Rank'] = top10_overall.index + 1
-                                    cols_overall = ['Rank'] + [col for col in top10_overall.columns if col != 'Rank']
-                                    top10_overall = top10_overall[cols_overall]
-                                    top10_overall.set_index('Rank', inplace=True)
-
-                                    top10_overall.rename(columns={'playerFullName': 'Player', position_column: 'Position'}, inplace=True)
-                                    if team_column:
-                                        top10_overall.rename(columns={team_column: 'Team'}, inplace=True)
-
-                                    top10_overall[metric] = top10_overall.apply(
-                                        lambda row: f"{row[metric]:.2f} ({row[f'{metric}_cum_avg']:.2f})"
-                                        if pd.notnull(row[f'{metric}_cum_avg']) else f"{row[metric]:.2f}",
-                                        axis=1
-                                    )
-
-                                    top10_overall.drop(columns=[f'{metric}_cum_avg'], inplace=True)
-                                    cols_overall = ['Player', 'Age', 'Team', 'Position', 'Min', metric]
-                                    top10_overall = top10_overall[cols_overall]
-
-                                    st.markdown(f"<h2>{metric} (Overall Top 10)</h2>", unsafe_allow_html=True)
-
-                                    def color_row_overall(row):
-                                        if row['Age'] < 24:
-                                            return ['background-color: #d4edda'] * len(row)
-                                        else:
-                                            return [''] * len(row)
-
-                                    top10_overall_styled = top10_overall.style.apply(color_row_overall, axis=1)
-                                    st.dataframe(top10_overall_styled)
-
-                # Display metric tables
-                display_metric_tables(physical_offensive_metrics, "Physical Offensive Metrics")
-                display_metric_tables(physical_defensive_metrics, "Physical Defensive Metrics")
-                display_metric_tables(offensive_metrics, "Offensive Metrics")
-                display_metric_tables(defensive_metrics, "Defensive Metrics")
-
-            # Glossary section
+                        if blocks:
+                            st.markdown(section_html(blocks), unsafe_allow_html=True)
+
+            # Similar players: nearest neighbours of one player within the selected position group
+            with st.expander("Similar Players", expanded=False):
+                show_similar_players(
+                    data_version, selected_season, selected_league, selected_position_group, team_column
+                )
+
+            # Glossary section (prebuilt static block)
             with st.expander("Glossary"):
-                sections = {
-                    "Ratings": [
-                        'Overall Rating',
-                        'Defensive Rating',
-                        'Goal Threat Rating',
-                        'Offensive Rating',
-                        'Physical Defensive Rating',
-                        'Physical Offensive Rating',
-                        'Pass Rating',
-                        'Activity Rating',
-                        'Ballcarrier Rating'
-                    ],
-                    "Offensive Metrics": [
-                        '2ndAst', 'Ast', 'ExpG', 'ExpGExPn', 'Goal', 'GoalExPn', 'KeyPass',
-                        'MinPerChnc', 'MinPerGoal', 'PsAtt', 'PsCmp', 'Pass%', 'PsIntoA3rd',
-                        'PsRec', 'ProgCarry', 'ProgPass', 'Shot', 'OnTarget%', 'Shot conversion',
-                        'Shot/Goal', 'SOG', 'Success1v1', 'Take on into the Box',
-                        'TakeOn', 'ThrghBalls', 'TouchOpBox', 'Touches', 'xA',
-                        'xA +/-', 'xG +/-', 'xGOT'
-                    ],
-                    "Defensive Metrics": [
-                        'AdjInt', 'AdjTckl', 'Blocks', 'Clrnce', 'Int',
-                        'TcklAtt', 'Tckl', 'TcklMade%', 'TcklA3'
-                    ],
-                    "Physical Offensive Metrics": physical_offensive_metrics,
-                    "Physical Defensive Metrics": physical_defensive_metrics,
-                    "Activity Metrics": activity_metrics,
-                    "Ballcarrier Metrics": ballcarrier_metrics
-                }
-
-                for section, metrics in sections.items():
-                    st.markdown(
-                        f"<h3 style='font-size:15px; color:#333; font-weight:bold;'>{section}</h3>",
-                        unsafe_allow_html=True
-                    )
-                    for metric in metrics:
-                        explanation = glossary.get(metric, "")
-                        st.markdown(f"{metric}: *{explanation}*")
+                st.markdown(glossary_html(), unsafe_allow_html=True)
 
         else:
             st.write("Please set your filters and click 'Run' to display the data.")
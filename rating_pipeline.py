@@ -0,0 +1,889 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import MinMaxScaler, QuantileTransformer
+
+from metric_store import MetricStore
+
+try:
+    import polars as pl
+except ImportError:  # Polars is optional, the pandas engine is always available
+    pl = None
+
+# Column selections and reset_index must share memory with the (read-only, memory-mapped)
+# partitions instead of copying them, which is copy-on-write. It is always on from pandas 3.
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+# Define position groups with potential overlaps
+POSITION_GROUPS = {
+    'IV': ['Left Centre Back', 'Right Centre Back', 'Central Defender'],
+    'AV': ['Left Back', 'Right Back'],
+    'FLV': ['Left Wing Back', 'Right Wing Back'],
+    'AVFLV': ['Left Back', 'Right Back', 'Left Wing Back', 'Right Wing Back'],
+    'ZDM': ['Defensive Midfielder'],
+    'ZDMZM': ['Defensive Midfielder', 'Central Midfielder'],
+    'ZM': ['Central Midfielder'],
+    'ZOM': ['Centre Attacking Midfielder'],
+    'ZMZOM': ['Central Midfielder', 'Centre Attacking Midfielder'],
+    'FS': ['Left Midfielder', 'Right Midfielder', 'Left Attacking Midfielder', 'Right Attacking Midfielder'],
+    'ST': ['Left Winger', 'Right Winger', 'Second Striker', 'Centre Forward']
+}
+
+# Text-based percentage metrics ('73.5%')
+PERCENTAGE_METRICS = ['TcklMade%', 'Pass%', 'OnTarget%']
+
+# Define the main metric groups
+PHYSICAL_METRICS = [
+    'PSV-99', 'Distance', 'M/min', 'HSR Distance', 'HSR Count', 'Sprint Distance',
+    'Sprint Count', 'HI Distance', 'HI Count', 'Medium Acceleration Count',
+    'High Acceleration Count', 'Medium Deceleration Count', 'High Deceleration Count',
+    'Distance OTIP', 'M/min OTIP', 'HSR Distance OTIP', 'HSR Count OTIP',
+    'Sprint Distance OTIP', 'Sprint Count OTIP', 'HI Distance OTIP', 'HI Count OTIP',
+    'Medium Acceleration Count OTIP', 'High Acceleration Count OTIP',
+    'Medium Deceleration Count OTIP', 'High Deceleration Count OTIP'
+]
+
+OFFENSIVE_METRICS = [
+    '2ndAst', 'Ast', 'ExpG', 'ExpGExPn', 'Goal', 'GoalExPn', 'KeyPass',
+    'MinPerChnc', 'MinPerGoal', 'PsAtt', 'PsCmp', 'Pass%', 'PsIntoA3rd',
+    'PsRec', 'ProgCarry', 'ProgPass', 'Shot', 'Shot conversion',
+    'Shot/Goal', 'SOG', 'OnTarget%', 'Success1v1', 'Take on into the Box',
+    'TakeOn', 'ThrghBalls', 'TouchOpBox', 'Touches', 'xA',
+    'xA +/-', 'xG +/-', 'xGOT'
+]
+
+DEFENSIVE_METRICS = [
+    'TcklMade%', 'TcklAtt', 'Tckl', 'AdjTckl', 'TcklA3', 'Blocks', 'Int', 'AdjInt', 'Clrnce'
+]
+
+GOAL_THREAT_METRICS = [
+    'Goal', 'Shot/Goal', 'MinPerGoal', 'ExpG', 'xGOT', 'xG +/-',
+    'Shot', 'SOG', 'Shot conversion', 'OnTarget%'
+]
+
+ACTIVITY_METRICS = ['Touches', 'TouchOpBox', 'PsRec']
+BALLCARRIER_METRICS = ['TakeOn', 'Success1v1', 'Take on into the Box', 'ProgCarry']
+
+# Define physical metrics subsets
+PHYSICAL_OFFENSIVE_METRICS = [
+    'PSV-99', 'Distance', 'M/min', 'HSR Distance', 'HSR Count', 'Sprint Distance',
+    'Sprint Count', 'HI Distance', 'HI Count',
+    'Medium Acceleration Count', 'High Acceleration Count',
+    'Medium Deceleration Count', 'High Deceleration Count'
+]
+
+PHYSICAL_DEFENSIVE_METRICS = [
+    'Distance OTIP', 'M/min OTIP', 'HSR Distance OTIP', 'HSR Count OTIP',
+    'Sprint Distance OTIP', 'Sprint Count OTIP', 'HI Distance OTIP',
+    'HI Count OTIP', 'Medium Acceleration Count OTIP',
+    'High Acceleration Count OTIP', 'Medium Deceleration Count OTIP',
+    'High Deceleration Count OTIP'
+]
+
+# Define pass metrics (with weighting logic already in place before log transform)
+PASS_METRICS = [
+    'PsAtt', 'PsCmp', 'Pass%', 'PsIntoA3rd', 'KeyPass', 'ThrghBalls'
+]
+PASS_WEIGHTS = {
+    'PsAtt': 1.0,
+    'PsCmp': 1.0,
+    'Pass%': 1.0,
+    'PsIntoA3rd': 2.0,
+    'KeyPass': 2.0,
+    'ThrghBalls': 2.0
+}
+
+# Combine all metrics for processing (dict.fromkeys keeps a stable column order)
+ALL_METRICS = list(dict.fromkeys(
+    PHYSICAL_METRICS
+    + OFFENSIVE_METRICS
+    + DEFENSIVE_METRICS
+    + GOAL_THREAT_METRICS
+    + PERCENTAGE_METRICS
+    + ACTIVITY_METRICS
+    + BALLCARRIER_METRICS
+))
+
+# Metric groups by name
+METRIC_GROUPS = {
+    'physical': PHYSICAL_METRICS,
+    'physical_offensive': PHYSICAL_OFFENSIVE_METRICS,
+    'physical_defensive': PHYSICAL_DEFENSIVE_METRICS,
+    'offensive': OFFENSIVE_METRICS,
+    'defensive': DEFENSIVE_METRICS,
+    'goal_threat': GOAL_THREAT_METRICS,
+    'pass': PASS_METRICS,
+    'activity': ACTIVITY_METRICS,
+    'ballcarrier': BALLCARRIER_METRICS,
+}
+
+# Metric groups that get the conditional NaN fill, in the order they are applied
+FILL_GROUPS = ['physical', 'offensive', 'defensive', 'goal_threat', 'activity', 'ballcarrier']
+
+# Metric group behind each rating (the Overall Rating is the mean of the other ratings)
+RATING_GROUPS = {
+    'Physical Offensive Rating': 'physical_offensive',
+    'Physical Defensive Rating': 'physical_defensive',
+    'Offensive Rating': 'offensive',
+    'Defensive Rating': 'defensive',
+    'Goal Threat Rating': 'goal_threat',
+    'Pass Rating': 'pass',
+    'Activity Rating': 'activity',
+    'Ballcarrier Rating': 'ballcarrier',
+}
+
+# Gather all rating columns
+RATING_METRICS = [
+    'Overall Rating',
+    'Physical Offensive Rating',
+    'Physical Defensive Rating',
+    'Offensive Rating',
+    'Defensive Rating',
+    'Goal Threat Rating',
+    'Pass Rating',
+    'Activity Rating',
+    'Ballcarrier Rating'
+]
+
+# Ratings that count towards the Overall Rating.
+# NOTE: If you want to include the new ratings in Overall Rating, add them here.
+OVERALL_RATING_COMPONENTS = [
+    'Physical Offensive Rating',
+    'Physical Defensive Rating',
+    'Offensive Rating',
+    'Defensive Rating',
+    'Goal Threat Rating',
+    'Pass Rating'
+]
+
+# Ratings that are collected for the "Most Mentioned Players" table
+RATING_METRICS_TO_COLLECT = [
+    'Overall Rating',
+    'Offensive Rating',
+    'Goal Threat Rating',
+    'Pass Rating',
+    'Activity Rating',
+    'Ballcarrier Rating',
+    'Defensive Rating',
+    'Physical Offensive Rating',
+    'Physical Defensive Rating'
+]
+
+# Create a list of metrics for which we want cumulative averages
+METRICS_FOR_CUM_AVG = list(dict.fromkeys(
+    RATING_METRICS
+    + PHYSICAL_OFFENSIVE_METRICS
+    + PHYSICAL_DEFENSIVE_METRICS
+    + OFFENSIVE_METRICS
+    + DEFENSIVE_METRICS
+    + ACTIVITY_METRICS
+    + BALLCARRIER_METRICS
+))
+
+# Column layout of the metric store: the goal threat, pass, activity and ballcarrier metrics
+# are all part of the offensive metrics, so laying them out next to each other (inside the
+# offensive block) makes every metric group a contiguous slice of the store
+OFFENSIVE_SUBGROUP_METRICS = GOAL_THREAT_METRICS + PASS_METRICS + ACTIVITY_METRICS + BALLCARRIER_METRICS
+STORE_COLUMNS = (
+    PHYSICAL_OFFENSIVE_METRICS
+    + PHYSICAL_DEFENSIVE_METRICS
+    + OFFENSIVE_SUBGROUP_METRICS
+    + [metric for metric in OFFENSIVE_METRICS if metric not in OFFENSIVE_SUBGROUP_METRICS]
+    + DEFENSIVE_METRICS
+    + RATING_METRICS
+)
+STORE_GROUPS = dict(METRIC_GROUPS, ratings=RATING_METRICS)
+
+# Define metrics that are counts and should be summed
+COUNT_METRICS = [
+    'Goal', 'Ast', 'KeyPass', 'Shot', 'SOG', 'TakeOn', 'Success1v1', 'Blocks', 'Int', 'Clrnce',
+    'Tckl', 'AdjTckl', 'TcklAtt', 'AdjInt', 'TcklA3', 'ThrghBalls', 'TouchOpBox', 'Touches',
+    'Take on into the Box', '2ndAst', 'PsAtt', 'PsCmp', 'PsIntoA3rd', 'PsRec', 'ProgCarry', 'ProgPass',
+    'Shot conversion', 'Shot/Goal', 'HI Count', 'HI Count OTIP', 'Medium Acceleration Count',
+    'Medium Acceleration Count OTIP', 'Medium Deceleration Count', 'Medium Deceleration Count OTIP',
+    'High Acceleration Count', 'High Acceleration Count OTIP', 'High Deceleration Count',
+    'High Deceleration Count OTIP', 'HSR Count', 'HSR Count OTIP', 'Sprint Count', 'Sprint Count OTIP'
+]
+
+# Define metrics that should be averaged
+AVERAGE_METRICS = [
+    'Pass%', 'OnTarget%', 'TcklMade%', 'ExpG', 'ExpGExPn', 'xA', 'xG +/-', 'xA +/-', 'xGOT',
+    'MinPerGoal', 'MinPerChnc', 'PSV-99', 'Distance', 'Distance OTIP', 'M/min', 'M/min OTIP', 'HI Distance',
+    'HI Distance OTIP', 'HSR Distance', 'HSR Distance OTIP', 'Sprint Distance', 'Sprint Distance OTIP'
+] + RATING_METRICS
+
+# Number of players shown per table
+TOP_K = 10
+
+# Window sizes (in matches) of the rolling "form" averages shown next to every metric
+FORM_WINDOWS = (3, 5)
+
+
+# Return the first of the candidate columns that exists in the data (or None)
+def find_column(data, candidates):
+    for column in candidates:
+        if column in data.columns:
+            return column
+    return None
+
+
+def find_position_column(data):
+    return find_column(data, ['Position_x', 'Position'])
+
+
+def find_team_column(data):
+    return find_column(data, ['Team', 'Team_x', 'Squad'])
+
+
+# Calculate age from birthdate (vectorized, same result as the per-row lambda in PandasEngine)
+def compute_age(dob, today=None):
+    today = today or datetime.today()
+    birthday_ahead = (dob.dt.month > today.month) | (
+        (dob.dt.month == today.month) & (dob.dt.day > today.day)
+    )
+    return today.year - dob.dt.year - birthday_ahead.astype(int)
+
+
+# Season of each match date as '2024-25'. Seasons run from July to June; missing dates
+# get a missing season.
+def season_of(dates):
+    start_year = (dates.dt.year - (dates.dt.month < 7).astype(int)).astype('Int64')
+    labels = start_year.astype(str) + '-' + ((start_year + 1) % 100).astype(str).str.zfill(2)
+    return labels.where(start_year.notna())
+
+
+# Ingest step: integer surrogate key per player and categorical dtypes for the descriptive
+# columns, so all group-bys, merges and filters hash ints instead of strings. There is no
+# separate lookup table for the keys: every row carries its player's name and DOB, and
+# the tables take the names from the rows they show. The playerFullName category codes
+# are not player keys (two players with the same name share a category).
+def add_surrogate_keys(data):
+    # Rows without a player name can't be attributed to anyone
+    if data['playerFullName'].isna().any():
+        data = data[data['playerFullName'].notna()].copy()
+
+    # Two players can share a full name, so a player is identified by name and birthdate.
+    # Keys are numbered in name order, which keeps tie order in the top lists alphabetical.
+    data['player_id'] = (
+        data.groupby(['playerFullName', 'DOB'], sort=True, dropna=False, observed=True)
+        .ngroup()
+        .astype('int32')
+    )
+
+    for column in ['playerFullName', 'League', find_team_column(data), find_position_column(data)]:
+        if column and not isinstance(data[column].dtype, pd.CategoricalDtype):
+            data[column] = data[column].astype('category')
+    return data
+
+
+# Each player's latest row per league (by Date). Its cumulative averages cover the
+# player's whole season so far.
+def latest_player_rows(data, columns):
+    return (
+        data[columns]
+        .sort_values('Date', kind='stable')
+        .drop_duplicates(['League', 'player_id'], keep='last')
+        .sort_values(['League', 'player_id'], kind='stable')
+    )
+
+
+# Convert a text-based metric column to numbers ('1,5' -> 1.5, '73.5%' -> 73.5)
+def metric_to_number(column, metric):
+    if metric in PERCENTAGE_METRICS:
+        # Remove percentage signs and convert to numeric
+        return pd.to_numeric(column.astype(str).str.replace('%', ''), errors='coerce')
+    return pd.to_numeric(column.astype(str).str.replace(',', '.'), errors='coerce')
+
+
+def form_column(metric, window):
+    return f'{metric}_form{window}'
+
+
+# Per-row running averages that are carried into the tables with a 'last' aggregation:
+# the season-to-date average and the form over the last matches
+def running_columns(metric):
+    return [f'{metric}_cum_avg'] + [form_column(metric, window) for window in FORM_WINDOWS]
+
+
+# Counts are summed over the selected matchdays, everything else is averaged
+def aggregation_for(metric):
+    if metric in COUNT_METRICS:
+        return 'sum'
+    return 'mean'
+
+
+# Fit the quantile transform + 0-10 scaling on a metric block and average it per row.
+# The block is a private copy, so both steps transform it in place.
+def _rate_block(values):
+    scaler = MinMaxScaler(feature_range=(0, 10), copy=False)
+    quantile_transformer = QuantileTransformer(output_distribution='uniform', random_state=0, copy=False)
+    return scaler.fit_transform(quantile_transformer.fit_transform(values)).mean(axis=1)
+
+
+# Calculate the ratings from the coerced and filled metrics. block(group) returns a fresh
+# 2-D array of the group's metrics (in METRIC_GROUPS column order) with NaN set to 0, so
+# every engine shares exactly the same scikit-learn fits.
+def compute_ratings(block):
+    ratings = {}
+    for rating, group in RATING_GROUPS.items():
+        values = block(group)
+        if group == 'pass':
+            # Pass Rating with LOG TRANSFORM + weighting **before** log
+            values *= np.array([PASS_WEIGHTS[col] for col in PASS_METRICS], dtype=values.dtype)
+            np.log1p(values, out=values)
+        # Activity and Ballcarrier Rating (no log, no extra weighting)
+        ratings[rating] = _rate_block(values)
+    ratings['Overall Rating'] = np.mean([ratings[name] for name in OVERALL_RATING_COMPONENTS], axis=0)
+    return ratings
+
+
+# Rating blocks taken from a pandas or Polars frame
+def frame_blocks(frame):
+    def block(group):
+        return np.nan_to_num(frame[METRIC_GROUPS[group]].to_numpy().astype(float), copy=False, nan=0.0)
+    return block
+
+
+# Turn the per-player aggregation of the top players into the displayed table. percentiles
+# (optional, one per row) are shown as the 'Pct' column.
+def format_top_table(top, metric, team_column, position_column, percentiles=None):
+    # Keep only the columns the table is built from before adding the display columns
+    cum_avg = f'{metric}_cum_avg'
+    shown = ['playerFullName', 'Age', team_column, position_column, 'Min', 'Min_Total', metric, cum_avg]
+    shown += [form_column(metric, window) for window in FORM_WINDOWS]
+    top = top[[column for column in shown if column and column in top.columns]].reset_index(drop=True)
+    top['Age'] = top['Age'].round(0).astype(int)
+    top['Min'] = [
+        f"{int(minutes)} ({int(minutes_total)})"
+        for minutes, minutes_total in zip(top['Min'], top['Min_Total'])
+    ]
+    if cum_avg in top.columns:
+        top[metric] = [
+            f"{value:.2f} ({avg:.2f})" if pd.notnull(avg) else f"{value:.2f}"
+            for value, avg in zip(top[metric], top[cum_avg])
+        ]
+    else:
+        top[metric] = [f"{value:.2f}" for value in top[metric]]
+
+    percentile_columns = []
+    if percentiles is not None:
+        percentile_columns.append('Pct')
+        top['Pct'] = [f"{value:.0f}" if pd.notnull(value) else '' for value in percentiles]
+
+    form_columns = []
+    for window in FORM_WINDOWS:
+        if form_column(metric, window) in top.columns:
+            form_columns.append(f'Form ({window})')
+            top[f'Form ({window})'] = [
+                f"{value:.2f}" if pd.notnull(value) else ''
+                for value in top[form_column(metric, window)]
+            ]
+
+    top.index = top.index + 1
+    top.index.name = 'Rank'
+    top = top.rename(columns={'playerFullName': 'Player', position_column: 'Position'})
+    if team_column:
+        top = top.rename(columns={team_column: 'Team'})
+    else:
+        top['Team'] = ''
+    return top[['Player', 'Age', 'Team', 'Position', 'Min', metric] + percentile_columns + form_columns]
+
+
+# Count how often each player shows up in the weekly top lists
+def build_mentions(weekly_top, metrics, team_column, position_column):
+    columns = ['Player', 'Age', 'Team', 'Position', 'Total Mentions'] + metrics
+    if weekly_top.empty:
+        return pd.DataFrame(columns=columns)
+
+    # Player details come from the first week/metric the player was mentioned in
+    first = weekly_top.drop_duplicates('player_id').set_index('player_id')
+    counts = (
+        weekly_top.groupby(['player_id', 'Metric'], observed=True).size()
+        .unstack(fill_value=0)
+        .reindex(index=first.index, columns=metrics, fill_value=0)
+    )
+    mentions = pd.DataFrame({
+        'Player': first['playerFullName'].to_numpy(),
+        'Age': first['Age'].to_numpy(),
+        'Team': first[team_column].to_numpy() if team_column else '',
+        'Position': first[position_column].to_numpy(),
+        'Total Mentions': counts.sum(axis=1).to_numpy(),
+    })
+    for metric in metrics:
+        mentions[metric] = counts[metric].to_numpy()
+    return mentions.sort_values(by='Total Mentions', ascending=False, kind='stable').reset_index(drop=True)
+
+
+# Reference implementation. Every stage is plain pandas and mirrors the original
+# dashboard code, it is the baseline the other engines are checked against.
+class PandasEngine:
+    name = 'pandas'
+
+    def coerce(self, data):
+        # Calculate age from birthdate
+        data['DOB'] = pd.to_datetime(data['DOB'])
+        today = datetime.today()
+        data['Age'] = data['DOB'].apply(
+            lambda x: today.year - x.year - ((today.month, today.day) < (x.month, x.day))
+        )
+
+        # Ensure 'Date' is in datetime format
+        data['Date'] = pd.to_datetime(data['Date'])
+
+        # Convert text-based numbers to numeric, handling percentage metrics
+        for metric in ALL_METRICS:
+            if metric in data.columns:
+                data[metric] = metric_to_number(data[metric], metric)
+
+        # Ensure 'Min' column is numeric
+        if 'Min' not in data.columns:
+            raise KeyError("Column 'Min' not found in data.")
+        data['Min'] = pd.to_numeric(data['Min'], errors='coerce')
+        return data
+
+    # Fill NaN values with 0 only for players who have any non-NaN value in the group of metrics
+    def fill(self, data):
+        for group in FILL_GROUPS:
+            metric_group = METRIC_GROUPS[group]
+            # Create a mask where any metric in the group is not NaN
+            mask = data[metric_group].notna().any(axis=1)
+            # Apply filling only to rows where the mask is True
+            data.loc[mask, metric_group] = data.loc[mask, metric_group].fillna(0)
+        return data
+
+    def rate(self, data):
+        for name, values in compute_ratings(frame_blocks(data)).items():
+            data[name] = values
+        return data
+
+    # Calculate cumulative averages for each player in each league
+    def cumulative_averages(self, data):
+        data = data.sort_values(['League', 'player_id', 'Date'])
+        for metric in METRICS_FOR_CUM_AVG:
+            data[f'{metric}_cum_avg'] = (
+                data
+                .groupby(['League', 'player_id'], observed=True)[metric]
+                .expanding()
+                .mean()
+                .reset_index(level=[0, 1], drop=True)
+            )
+        return data.reset_index(drop=True)
+
+    # Rolling "form" averages over each player's last N matches in the league
+    def form(self, data):
+        grouped = data.groupby(['League', 'player_id'], observed=True)
+        form = {}
+        for window in FORM_WINDOWS:
+            for metric in METRICS_FOR_CUM_AVG:
+                form[form_column(metric, window)] = (
+                    grouped[metric]
+                    .rolling(window, min_periods=1)
+                    .mean()
+                    .reset_index(level=[0, 1], drop=True)
+                )
+        return pd.concat([data, pd.DataFrame(form)], axis=1)
+
+    def enrich(self, data):
+        data = add_surrogate_keys(data)
+        data = self.coerce(data)
+        data = self.fill(data)
+        data = self.rate(data)
+        data = self.cumulative_averages(data)
+        return self.form(data)
+
+    def minutes_total(self, data):
+        minutes_total = data.groupby('player_id')['Min'].sum().reset_index()
+        return minutes_total.rename(columns={'Min': 'Min_Total'})
+
+    # Aggregate the rows of the selected matchdays per player for all metrics at once
+    def aggregate_players(self, rows, metrics, team_column, position_column, minutes_total=None):
+        agg_dict = {'playerFullName': 'first', 'Age': 'last'}
+        for metric in metrics:
+            agg_dict[metric] = aggregation_for(metric)
+            for column in running_columns(metric):
+                if column in rows.columns:
+                    agg_dict[column] = 'last'
+        agg_dict['Min'] = 'sum'
+        if team_column:
+            agg_dict[team_column] = 'last'
+        if position_column in rows.columns:
+            agg_dict[position_column] = 'last'
+
+        aggregated = rows.groupby('player_id').agg(agg_dict).reset_index()
+        if minutes_total is not None:
+            aggregated = aggregated.merge(minutes_total, on='player_id', how='left')
+        return aggregated
+
+    # Rank on the metric column alone and copy only the k winning rows (dropna and
+    # sort_values on the aggregated frame would copy all of its columns per metric)
+    def top_k(self, aggregated, metric, k=TOP_K):
+        ranked = aggregated[metric].reset_index(drop=True).dropna()
+        winners = ranked.sort_values(ascending=False, kind='stable').index[:k]
+        return aggregated.take(winners).reset_index(drop=True)
+
+    # Top players per matchday and metric, as one long table (Week, Metric, Rank, Value, player columns)
+    def weekly_top_k(self, rows, metrics, team_column, position_column, k=TOP_K):
+        # Only the columns the weekly tables show are split per week
+        player_columns = [col for col in (team_column, position_column) if col and col in rows.columns]
+        rows = rows[['Week', 'player_id', 'playerFullName', 'Age', 'Min'] + metrics + player_columns]
+        frames = []
+        for week, week_data in rows.groupby('Week', sort=True):
+            aggregated = self.aggregate_players(week_data, metrics, team_column, position_column)
+            for metric in metrics:
+                top = self.top_k(aggregated, metric, k)
+                frames.append(pd.DataFrame({
+                    'Week': week,
+                    'Metric': metric,
+                    'Rank': np.arange(1, len(top) + 1),
+                    'Value': top[metric].to_numpy(),
+                    **{column: top[column].to_numpy() for column in ['player_id', 'playerFullName', 'Age'] + player_columns},
+                }))
+        return _weekly_top_columns(frames, rows, team_column, position_column)
+
+
+# Same stages as the reference, but the metrics live in a float32 MetricStore instead of
+# pandas columns: the coerced values are written straight into the block (already in the
+# player/date order the cumulative averages need), the conditional fill writes into group
+# views and the cumulative averages are computed per column with segmented running sums.
+# The enriched frame wraps the store blocks without copying them.
+class NumpyEngine(PandasEngine):
+    name = 'numpy'
+
+    def enrich(self, data):
+        data = add_surrogate_keys(data)
+
+        data['DOB'] = pd.to_datetime(data['DOB'])
+        data['Age'] = compute_age(data['DOB'])
+        data['Date'] = pd.to_datetime(data['Date'])
+        if 'Min' not in data.columns:
+            raise KeyError("Column 'Min' not found in data.")
+        data['Min'] = pd.to_numeric(data['Min'], errors='coerce')
+
+        # Row order for the cumulative averages (same stable sort as the reference)
+        keys = data[['League', 'player_id', 'Date']].reset_index(drop=True)
+        order = keys.sort_values(['League', 'player_id', 'Date']).index.to_numpy()
+
+        metrics = [metric for metric in ALL_METRICS if metric in data.columns]
+        store = MetricStore(STORE_COLUMNS, len(data), STORE_GROUPS)
+        for metric in metrics:
+            store.column(metric)[:] = metric_to_number(data[metric], metric).to_numpy(
+                dtype=np.float64, na_value=np.nan
+            )[order]
+
+        self.fill_store(store)
+        self.rate_store(store, order)
+        running = self.running_stores(store, keys['League'].to_numpy()[order], keys['player_id'].to_numpy()[order])
+
+        others = data.drop(columns=metrics).take(order).reset_index(drop=True)
+        return pd.concat(
+            [others, store.to_frame()] + [averages.to_frame(suffix) for suffix, averages in running.items()],
+            axis=1
+        )
+
+    # Fill NaN values with 0 only for rows that have any non-NaN value in the group of
+    # metrics. A group lying inside an already filled one (goal threat, activity and
+    # ballcarrier inside offensive) has only complete or entirely missing rows left, so
+    # it is skipped: the same result as the reference's one-after-another fill.
+    def fill_store(self, store):
+        filled = []
+        for group in FILL_GROUPS:
+            columns = store.slices[group]
+            if any(outer.start <= columns.start and columns.stop <= outer.stop for outer in filled):
+                continue
+            values = store.group(group)
+            missing = np.isnan(values)
+            np.copyto(values, 0, where=missing & ~missing.all(axis=1)[:, None])
+            filled.append(columns)
+        store.filled.update(FILL_GROUPS)
+
+    def rate_store(self, store, order):
+        # QuantileTransformer subsamples rows by position, so the fits see the rows in their
+        # original order, exactly like the reference
+        inverse = np.empty_like(order)
+        inverse[order] = np.arange(len(order))
+
+        def block(group):
+            values = np.take(store.group(group), inverse, axis=0)
+            if store.is_filled(group):
+                # Only entirely missing rows are left, one column tells which they are
+                values[np.isnan(values[:, 0])] = 0
+                return values
+            return np.nan_to_num(values, copy=False, nan=0.0)
+
+        for name, values in compute_ratings(block).items():
+            store.column(name)[:] = values[order]
+
+    # Expanding mean (cumulative average) and rolling form means per (League, player) over
+    # rows sorted by League, player and Date, for every store column in a single pass.
+    # Both come from one prefix sum per column: the mean over rows [low, i] is
+    # (prefix[i + 1] - prefix[low]) / (count[i + 1] - count[low]), which is O(1) per row
+    # for any window. low is the player's first row (cumulative) or max(first row, i + 1 - N).
+    def running_stores(self, store, leagues, player_ids):
+        n_rows = len(store)
+        running = {'_cum_avg': MetricStore(store.columns, n_rows)}
+        for window in FORM_WINDOWS:
+            running[f'_form{window}'] = MetricStore(store.columns, n_rows)
+        if n_rows == 0:
+            return running
+
+        has_league = ~pd.isna(leagues)
+        starts = np.ones(n_rows, dtype=bool)
+        starts[1:] = (player_ids[1:] != player_ids[:-1]) | (leagues[1:] != leagues[:-1])
+        first_row = np.flatnonzero(starts)[np.cumsum(starts) - 1]
+        rows = np.arange(n_rows)
+        lower = {'_cum_avg': first_row}
+        for window in FORM_WINDOWS:
+            lower[f'_form{window}'] = np.maximum(first_row, rows + 1 - window)
+
+        for position in range(len(store.columns)):
+            values = store.values[:, position]
+            present = ~np.isnan(values)
+            prefix = np.concatenate(([0.0], np.cumsum(np.where(present, values, 0), dtype=np.float64)))
+            count = np.concatenate(([0], np.cumsum(present)))
+            for suffix, low in lower.items():
+                sums = prefix[rows + 1] - prefix[low]
+                counts = count[rows + 1] - count[low]
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    running[suffix].values[:, position] = np.where(
+                        (counts > 0) & has_league, sums / counts, np.nan
+                    )
+        return running
+
+
+def _weekly_top_columns(frames, rows, team_column, position_column):
+    columns = ['Week', 'Metric', 'Rank', 'Value', 'player_id', 'playerFullName', 'Age']
+    columns += [col for col in (team_column, position_column) if col and col in rows.columns]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)[columns]
+
+
+# Polars lazy-query implementation of the same stages. Coercion, conditional fill,
+# cumulative averages, aggregation and top-k run as multi-threaded lazy plans; the
+# rating fits go through the shared scikit-learn code. Inputs and outputs are pandas
+# frames so the engines are interchangeable.
+class PolarsEngine:
+    name = 'polars'
+
+    def __init__(self):
+        if pl is None:
+            raise ImportError("The polars engine requires the 'polars' package.")
+
+    @staticmethod
+    def _as_datetime(schema, column):
+        if schema[column] == pl.String:
+            return pl.col(column).str.to_datetime(strict=False)
+        return pl.col(column).cast(pl.Datetime)
+
+    @staticmethod
+    def _to_number(column, remove, replacement):
+        return (
+            pl.col(column)
+            .cast(pl.String)
+            .str.replace_all(remove, replacement, literal=True)
+            .str.strip_chars()
+            .cast(pl.Float64, strict=False)
+            .fill_nan(None)
+        )
+
+    # Coercion and the conditional fill, fused into one lazy plan
+    def _prepare(self, frame):
+        if 'Min' not in frame.columns:
+            raise KeyError("Column 'Min' not found in data.")
+        schema = frame.schema
+        today = datetime.today()
+
+        dob = pl.col('DOB')
+        birthday_ahead = (dob.dt.month() > today.month) | (
+            (dob.dt.month() == today.month) & (dob.dt.day() > today.day)
+        )
+        query = frame.lazy().with_columns(
+            self._as_datetime(schema, 'DOB'),
+            self._as_datetime(schema, 'Date'),
+        ).with_columns(
+            (today.year - dob.dt.year().cast(pl.Int64) - birthday_ahead.cast(pl.Int64)).alias('Age'),
+            *[
+                self._to_number(metric, '%', '') if metric in PERCENTAGE_METRICS
+                else self._to_number(metric, ',', '.')
+                for metric in ALL_METRICS if metric in frame.columns
+            ],
+            pl.col('Min').cast(pl.String).str.strip_chars().cast(pl.Float64, strict=False),
+        )
+
+        # The groups overlap, so they are filled one after another like the reference
+        for group in FILL_GROUPS:
+            metric_group = METRIC_GROUPS[group]
+            mask = pl.any_horizontal([pl.col(metric).is_not_null() for metric in metric_group])
+            query = query.with_columns(
+                pl.when(mask).then(pl.col(metric).fill_null(0)).otherwise(pl.col(metric))
+                for metric in metric_group
+            )
+        return query
+
+    # Cumulative averages and rolling form means from running sums; a window of N rows
+    # is the running sum minus the running sum N rows earlier (O(1) per row)
+    def _cumulative_averages(self, query):
+        keys = ['League', 'player_id']
+        has_keys = pl.col('League').is_not_null()
+
+        def windowed(expr, window):
+            running = expr.cum_sum()
+            if window is None:
+                return running.over(keys)
+            return (running - running.shift(window, fill_value=0)).over(keys)
+
+        def mean(metric, window):
+            sums = windowed(pl.col(metric).fill_null(0), window)
+            counts = windowed(pl.col(metric).is_not_null().cast(pl.Int64), window)
+            return pl.when(has_keys).then(sums / counts).fill_nan(None)
+
+        return query.sort(
+            ['League', 'player_id', 'Date'], nulls_last=True, maintain_order=True
+        ).with_columns(
+            mean(metric, None).alias(f'{metric}_cum_avg')
+            for metric in METRICS_FOR_CUM_AVG
+        ).with_columns(
+            mean(metric, window).alias(form_column(metric, window))
+            for window in FORM_WINDOWS
+            for metric in METRICS_FOR_CUM_AVG
+        )
+
+    def enrich(self, data):
+        data = add_surrogate_keys(data)
+        prepared = self._prepare(pl.from_pandas(data)).collect()
+        prepared = prepared.with_columns(
+            pl.Series(name, values) for name, values in compute_ratings(frame_blocks(prepared)).items()
+        )
+        enriched = self._cumulative_averages(prepared.lazy()).collect().to_pandas()
+
+        # Polars hands categories back in order of appearance, restore the (sorted) originals
+        for column in enriched.columns:
+            if isinstance(enriched[column].dtype, pd.CategoricalDtype):
+                enriched[column] = enriched[column].cat.set_categories(data[column].cat.categories)
+        return enriched
+
+    def minutes_total(self, data):
+        return (
+            pl.from_pandas(data[['player_id', 'Min']]).lazy()
+            .group_by('player_id')
+            .agg(pl.col('Min').sum().alias('Min_Total'))
+            .sort('player_id')
+            .collect()
+            .to_pandas()
+        )
+
+    def _aggregations(self, columns, metrics, team_column, position_column):
+        aggs = [pl.col('playerFullName').first(), pl.col('Age').drop_nulls().last()]
+        for metric in metrics:
+            if aggregation_for(metric) == 'sum':
+                aggs.append(pl.col(metric).sum())
+            else:
+                aggs.append(pl.col(metric).mean())
+            for column in running_columns(metric):
+                if column in columns:
+                    aggs.append(pl.col(column).drop_nulls().last())
+        aggs.append(pl.col('Min').sum())
+        for column in (team_column, position_column):
+            if column and column in columns:
+                aggs.append(pl.col(column).drop_nulls().last())
+        return aggs
+
+    def _lazy_rows(self, rows, metrics, team_column, position_column, extra=()):
+        needed = ['player_id', 'playerFullName', 'Age', 'Min', *extra]
+        for metric in metrics:
+            needed += [metric, *running_columns(metric)]
+        needed += [team_column, position_column]
+        needed = [col for col in dict.fromkeys(needed) if col and col in rows.columns]
+        return pl.from_pandas(rows[needed]).lazy(), needed
+
+    def aggregate_players(self, rows, metrics, team_column, position_column, minutes_total=None):
+        query, columns = self._lazy_rows(rows, metrics, team_column, position_column)
+        query = query.group_by('player_id').agg(
+            self._aggregations(columns, metrics, team_column, position_column)
+        ).sort('player_id')
+        if minutes_total is not None:
+            query = query.join(pl.from_pandas(minutes_total).lazy(), on='player_id', how='left')
+        return query.collect().to_pandas()
+
+    # Only the metric column is handed to Polars; the k winning rows are taken from the
+    # aggregated frame instead of converting all of its columns per metric
+    def top_k(self, aggregated, metric, k=TOP_K):
+        winners = (
+            pl.from_pandas(aggregated[[metric]]).lazy()
+            .with_row_index('row')
+            .filter(pl.col(metric).is_not_null())
+            .sort(metric, descending=True, maintain_order=True)
+            .head(k)
+            .collect()
+        )
+        return aggregated.take(winners['row'].to_numpy()).reset_index(drop=True)
+
+    def weekly_top_k(self, rows, metrics, team_column, position_column, k=TOP_K):
+        query, columns = self._lazy_rows(rows, metrics, team_column, position_column, extra=['Week'])
+        weekly = query.filter(pl.col('Week').is_not_null()).group_by(['Week', 'player_id']).agg(
+            self._aggregations(columns, metrics, team_column, position_column)
+        ).sort(['Week', 'player_id'])
+
+        player_columns = ['player_id', 'playerFullName', 'Age']
+        player_columns += [col for col in (team_column, position_column) if col and col in columns]
+        per_metric = [
+            weekly
+            .filter(pl.col(metric).is_not_null())
+            .sort(['Week', metric], descending=[False, True], maintain_order=True)
+            .filter(pl.int_range(pl.len()).over('Week') < k)
+            .select(
+                pl.col('Week'),
+                pl.lit(metric).alias('Metric'),
+                (pl.int_range(pl.len()).over('Week') + 1).alias('Rank'),
+                pl.col(metric).alias('Value'),
+                *player_columns,
+            )
+            for metric in metrics
+        ]
+        frames = [frame.to_pandas() for frame in pl.collect_all(per_metric)]
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return _weekly_top_columns([], rows, team_column, position_column)
+        weekly_top = pd.concat(frames, ignore_index=True)
+        return weekly_top.sort_values('Week', kind='stable').reset_index(drop=True)
+
+
+ENGINES = {
+    PandasEngine.name: PandasEngine,
+    NumpyEngine.name: NumpyEngine,
+    PolarsEngine.name: PolarsEngine,
+}
+
+
+# Create the engine by name ('pandas', 'numpy' or 'polars')
+def get_engine(name='pandas'):
+    try:
+        engine_class = ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown rating engine '{name}'. Choose one of: {', '.join(ENGINES)}")
+    return engine_class()
+
+
+# Enrich the raw data season by season, so cumulative averages, form and the rating fits
+# never reach across seasons, and split the result into one frame per (Season, League).
+# Uses the data's 'Season' column when it has one, otherwise derives it from Date.
+# Rows without a season are left out and reported through warn(message).
+def enrich_partitioned(engine, data, warn=None):
+    if 'Season' not in data.columns:
+        data['Season'] = season_of(pd.to_datetime(data['Date']))
+
+    # Rows without a season (no match date) can't be placed in any partition
+    undated = data['Season'].isna()
+    if undated.any():
+        data = data[~undated]
+        if warn is not None:
+            warn(f"{undated.sum()} rows without a Date/Season were left out.")
+
+    partitions = {}
+    for season, season_rows in data.groupby('Season', sort=True):
+        enriched = engine.enrich(season_rows.reset_index(drop=True))
+        for league, rows in enriched.groupby('League', observed=True, sort=True):
+            partitions[(str(season), str(league))] = rows.reset_index(drop=True)
+    return partitions
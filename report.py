@@ -0,0 +1,316 @@
+import html
+from functools import lru_cache
+
+import pandas as pd
+
+from rating_pipeline import (
+    ACTIVITY_METRICS,
+    BALLCARRIER_METRICS,
+    DEFENSIVE_METRICS,
+    METRICS_FOR_CUM_AVG,
+    OFFENSIVE_METRICS,
+    PHYSICAL_DEFENSIVE_METRICS,
+    PHYSICAL_OFFENSIVE_METRICS,
+    POSITION_GROUPS,
+    RATING_METRICS_TO_COLLECT,
+    build_mentions,
+    format_top_table,
+)
+from single_flight import SingleFlight
+
+# Glossary content with metrics integrated
+GLOSSARY = {
+    'Ratings': 'A collection of aggregated performance metrics.',
+    'Overall Rating': 'Player\'s overall performance across all metrics.',
+    'Defensive Rating': 'Player\'s overall defensive performance. Metrics include various defensive actions.',
+    'Goal Threat Rating': 'Player\'s threat to score goals. Metrics include shots, expected goals, etc.',
+    'Offensive Rating': 'Player\'s overall offensive performance. Metrics include assists, key passes, etc.',
+    'Physical Offensive Rating': 'Player\'s physical contributions to offensive play.',
+    'Physical Defensive Rating': 'Player\'s physical contributions to defensive play.',
+    'Pass Rating': 'Player\'s overall passing performance. Metrics include pass attempts, completion, key passes, through balls, etc.',
+    'Activity Rating': 'Player\'s involvement in moves, receiving passes, and touches in advanced areas. (Touches, TouchOpBox, PsRec)',
+    'Ballcarrier Rating': 'Player\'s ability to carry the ball forward and beat opponents. (TakeOn, Success1v1, Take on into the Box, ProgCarry)',
+    'Min': 'Minutes played in the selected matchday(s) (total minutes played across all matchdays)',
+    'Form': 'Average over the player\'s last 3 (Form (3)) or 5 (Form (5)) matches up to the last selected matchday.',
+    'Pct': 'Percentile of the player\'s season average up to the last selected matchday (the value in brackets) against the current season averages of all players of the league and position group (100 = highest). Players count for the position group of their latest match.',
+    'Difference': 'Similar Players: distance between two players\' ratings and season averages, in standard deviations (lower is more similar).',
+    # Physical Metrics
+    'PSV-99': 'Player\'s physical performance score compared to peers.',
+    'Distance': 'Total distance covered by the player.',
+    'M/min': 'Meters covered per minute.',
+    'HSR Distance': 'High-speed running distance.',
+    'HSR Count': 'Number of high-speed runs.',
+    'Sprint Distance': 'Total sprint distance.',
+    'Sprint Count': 'Number of sprints.',
+    'HI Distance': 'High-intensity running distance.',
+    'HI Count': 'Number of high-intensity runs.',
+    'Medium Acceleration Count': 'Number of medium accelerations.',
+    'High Acceleration Count': 'Number of high accelerations.',
+    'Medium Deceleration Count': 'Number of medium decelerations.',
+    'High Deceleration Count': 'Number of high decelerations.',
+    'Distance OTIP': 'Distance covered out of team possession.',
+    'M/min OTIP': 'Meters per minute out of team possession.',
+    'HSR Distance OTIP': 'High-speed running distance out of team possession.',
+    'HSR Count OTIP': 'High-speed run count out of team possession.',
+    'Sprint Distance OTIP': 'Sprint distance out of team possession.',
+    'Sprint Count OTIP': 'Sprint count out of team possession.',
+    'HI Distance OTIP': 'High-intensity distance out of team possession.',
+    'HI Count OTIP': 'High-intensity count out of team possession.',
+    'Medium Acceleration Count OTIP': 'Medium accelerations out of team possession.',
+    'High Acceleration Count OTIP': 'High accelerations out of team possession.',
+    'Medium Deceleration Count OTIP': 'Medium decelerations out of team possession.',
+    'High Deceleration Count OTIP': 'High decelerations out of team possession.',
+    # Offensive Metrics
+    '2ndAst': 'Secondary assists.',
+    'Ast': 'Assists.',
+    'ExpG': 'Expected goals.',
+    'ExpGExPn': 'Expected goals excluding penalties.',
+    'Goal': 'Goals scored.',
+    'GoalExPn': 'Goals excluding penalties.',
+    'KeyPass': 'Passes leading directly to a shot.',
+    'MinPerChnc': 'Minutes per chance created.',
+    'MinPerGoal': 'Minutes per goal scored.',
+    'PsAtt': 'Passes attempted.',
+    'PsCmp': 'Passes completed.',
+    'Pass%': 'Pass completion percentage.',
+    'PsIntoA3rd': 'Passes into the attacking third.',
+    'PsRec': 'Passes received.',
+    'ProgCarry': 'Progressive carries.',
+    'ProgPass': 'Progressive passes.',
+    'Shot': 'Shots taken.',
+    'Shot conversion': 'Percentage of shots resulting in goals.',
+    'Shot/Goal': 'Shots per goal.',
+    'SOG': 'Shots on goal.',
+    'OnTarget%': 'Percentage of shots on target.',
+    'Success1v1': 'Successful one-on-one take-ons.',
+    'Take on into the Box': 'Take-ons into the penalty box.',
+    'TakeOn': 'Total take-ons attempted.',
+    'ThrghBalls': 'Through balls.',
+    'TouchOpBox': 'Touches in the opposition box.',
+    'Touches': 'Total touches.',
+    'xA': 'Expected assists.',
+    'xA +/-': 'Expected assists above or below average.',
+    'xG +/-': 'Expected goals above or below average.',
+    'xGOT': 'Expected goals on target.',
+    # Defensive Metrics
+    'AdjInt': 'Adjusted interceptions.',
+    'AdjTckl': 'Adjusted tackles.',
+    'Blocks': 'Blocks made.',
+    'Clrnce': 'Clearances.',
+    'Int': 'Interceptions.',
+    'TcklAtt': 'Tackle attempts.',
+    'Tckl': 'Tackles made.',
+    'TcklMade%': 'Percentage of successful tackles.',
+    'TcklA3': 'Tackles in the attacking third.',
+    # Percentage Metrics
+    'OnTarget%': 'Percentage of shots on target.',
+    'Pass%': 'Pass completion percentage.',
+    'TcklMade%': 'Percentage of tackles made successfully.',
+}
+
+# Glossary sections in display order
+GLOSSARY_SECTIONS = {
+    "Ratings": [
+        'Overall Rating',
+        'Defensive Rating',
+        'Goal Threat Rating',
+        'Offensive Rating',
+        'Physical Defensive Rating',
+        'Physical Offensive Rating',
+        'Pass Rating',
+        'Activity Rating',
+        'Ballcarrier Rating'
+    ],
+    "Offensive Metrics": [
+        '2ndAst', 'Ast', 'ExpG', 'ExpGExPn', 'Goal', 'GoalExPn', 'KeyPass',
+        'MinPerChnc', 'MinPerGoal', 'PsAtt', 'PsCmp', 'Pass%', 'PsIntoA3rd',
+        'PsRec', 'ProgCarry', 'ProgPass', 'Shot', 'OnTarget%', 'Shot conversion',
+        'Shot/Goal', 'SOG', 'Success1v1', 'Take on into the Box',
+        'TakeOn', 'ThrghBalls', 'TouchOpBox', 'Touches', 'xA',
+        'xA +/-', 'xG +/-', 'xGOT'
+    ],
+    "Defensive Metrics": [
+        'AdjInt', 'AdjTckl', 'Blocks', 'Clrnce', 'Int',
+        'TcklAtt', 'Tckl', 'TcklMade%', 'TcklA3'
+    ],
+    "Physical Offensive Metrics": PHYSICAL_OFFENSIVE_METRICS,
+    "Physical Defensive Metrics": PHYSICAL_DEFENSIVE_METRICS,
+    "Activity Metrics": ACTIVITY_METRICS,
+    "Ballcarrier Metrics": BALLCARRIER_METRICS,
+    "Table Columns": ['Min', 'Pct', 'Form', 'Difference']
+}
+
+# Metric tables shown below the ratings, one expander each
+METRIC_SECTIONS = {
+    "Physical Offensive Metrics": PHYSICAL_OFFENSIVE_METRICS,
+    "Physical Defensive Metrics": PHYSICAL_DEFENSIVE_METRICS,
+    "Offensive Metrics": OFFENSIVE_METRICS,
+    "Defensive Metrics": DEFENSIVE_METRICS,
+}
+
+# Rows of players younger than this are highlighted
+YOUNG_PLAYER_AGE = 24
+
+# Runs in progress in this process. Scouts pressing Run on the same selection at the same
+# time share one build_report (the report is only read when it is rendered).
+report_flights = SingleFlight()
+
+
+# Top 10 players of one metric from the per-player aggregation, as a display-ready
+# DataFrame (None when nobody has a value). With percentile_tables the table gets the
+# 'Pct' column: the season average in the table (up to the last selected matchday) placed
+# among the current season averages of the league and position group.
+def top_table(engine, aggregated, metric, league, position_group, team_column, position_column,
+              percentile_tables=None):
+    top10 = engine.top_k(aggregated, metric)
+    if top10.empty:
+        return None
+
+    percentiles = None
+    cum_avg = f'{metric}_cum_avg'
+    if percentile_tables is not None and cum_avg in top10.columns:
+        percentiles = percentile_tables.percentile(league, position_group, metric, top10[cum_avg])
+    return format_top_table(top10, metric, team_column, position_column, percentiles)
+
+
+# "Most Mentioned Players": how often each player of the league and position group made
+# a weekly top 10 of the collected ratings, over all matchdays. Empty when nobody did.
+# With the partition's weekly cube the weekly tables come from its cells, not the rows.
+def mentions_table(engine, data, league, position_group, team_column, position_column, cube=None):
+    mention_metrics = [metric for metric in RATING_METRICS_TO_COLLECT if metric in data.columns]
+    if cube is not None:
+        weekly_top = cube.weekly_top_k(data, POSITION_GROUPS[position_group], mention_metrics)
+    else:
+        # Only the columns the weekly tables read (a boolean mask copies every selected column)
+        mention_columns = ['Week', 'player_id', 'playerFullName', 'Age', 'Min'] + mention_metrics
+        mention_columns += [column for column in (team_column, position_column) if column]
+        rows = data.loc[
+            (data['League'] == league) & data[position_column].isin(POSITION_GROUPS[position_group]),
+            mention_columns
+        ]
+        weekly_top = engine.weekly_top_k(rows, mention_metrics, team_column, position_column)
+    mentions_df = build_mentions(weekly_top, RATING_METRICS_TO_COLLECT, team_column, position_column)
+    if not mentions_df.empty:
+        mentions_df['Age'] = mentions_df['Age'].round(0).astype(int)
+        mentions_df.index = mentions_df.index + 1
+        mentions_df.index.name = 'Rank'
+    return mentions_df
+
+
+# Compute every table of one Run. Returns {expander title: [(heading, content), ...]}
+# where content is a display-ready DataFrame or a message string, so nothing here
+# touches Streamlit and the result can be rendered in one go. With percentile_tables
+# the position group tables get a 'Pct' column.
+def build_report(engine, data, league, weeks, position_group, team_column, position_column,
+                 percentile_tables=None, cube=None):
+    # Aggregate the selected matchdays per player once for every metric in the tables.
+    # With the partition's weekly cube the rows are not filtered or grouped at all.
+    minutes_total = engine.minutes_total(data)
+    table_metrics = [metric for metric in METRICS_FOR_CUM_AVG if metric in data.columns]
+    if cube is not None:
+        aggregated_data = cube.aggregate_players(
+            data, weeks, POSITION_GROUPS[position_group], table_metrics, minutes_total
+        )
+    else:
+        # Filter data by the selected position group and the selected matchdays
+        league_week_mask = (data['League'] == league) & data['Week'].isin(weeks)
+        position_mask = data[position_column].isin(POSITION_GROUPS[position_group])
+        aggregated_data = engine.aggregate_players(
+            data[league_week_mask & position_mask], table_metrics, team_column, position_column, minutes_total
+        )
+
+    # Top 10 players of one metric as (heading, table), or a "No data" message
+    def top_table_block(aggregated, metric, heading, with_percentiles=True):
+        table = top_table(
+            engine, aggregated, metric, league, position_group, team_column, position_column,
+            percentile_tables if with_percentiles else None
+        )
+        if table is None:
+            return heading, "No data available"
+        return heading, table
+
+    report = {}
+
+    # Ratings Section
+    ratings = [
+        top_table_block(aggregated_data, metric, metric)
+        for metric in RATING_METRICS_TO_COLLECT
+        if metric in data.columns
+    ]
+
+    # Collect Mentions Over All Matchdays
+    mentions_df = mentions_table(engine, data, league, position_group, team_column, position_column, cube)
+    if not mentions_df.empty:
+        ratings.append(("Most Mentioned Players", mentions_df))
+    report["Ratings"] = ratings
+
+    # Other metric tables (including PSV-99 overall top 10)
+    for title, metrics_list in METRIC_SECTIONS.items():
+        blocks = []
+        for metric in metrics_list:
+            if metric not in data.columns:
+                blocks.append((None, f"Metric {metric} not found in the data"))
+                continue
+
+            blocks.append(top_table_block(aggregated_data, metric, metric))
+
+            # If the metric is 'PSV-99', also display the overall top 10 (ignoring position group)
+            if metric == 'PSV-99':
+                if cube is not None:
+                    aggregated_overall = cube.aggregate_players(data, weeks, None, [metric], minutes_total)
+                else:
+                    aggregated_overall = engine.aggregate_players(
+                        data[league_week_mask], [metric], team_column, position_column, minutes_total
+                    )
+                heading, content = top_table_block(
+                    aggregated_overall, metric, f"{metric} (Overall Top 10)", with_percentiles=False
+                )
+                if isinstance(content, pd.DataFrame):
+                    blocks.append((heading, content))
+        report[title] = blocks
+
+    return report
+
+
+# Render a display table as plain HTML. Young players get the 'young' row class instead
+# of a per-cell Styler, which keeps the payload small and fast to build.
+def table_html(table):
+    header = ''.join(
+        f'<th>{html.escape(str(column))}</th>' for column in [table.index.name or ''] + list(table.columns)
+    )
+    young = table['Age'] < YOUNG_PLAYER_AGE
+    rows = []
+    for rank, is_young, values in zip(table.index, young, table.itertuples(index=False, name=None)):
+        cells = ''.join(f'<td>{html.escape(str(value))}</td>' for value in values)
+        row_class = ' class="young"' if is_young else ''
+        rows.append(f'<tr{row_class}><th>{rank}</th>{cells}</tr>')
+    return (
+        f'<div class="top-table"><table><thead><tr>{header}</tr></thead>'
+        f'<tbody>{"".join(rows)}</tbody></table></div>'
+    )
+
+
+# Render one expander (all headings, tables and messages) as a single HTML payload.
+# There are no blank lines in it, so markdown treats it as one raw HTML block.
+def section_html(blocks):
+    parts = []
+    for heading, content in blocks:
+        if heading:
+            parts.append(f'<h2>{html.escape(heading)}</h2>')
+        if isinstance(content, pd.DataFrame):
+            parts.append(table_html(content))
+        else:
+            parts.append(f'<p>{html.escape(content)}</p>')
+    return '\n'.join(parts)
+
+
+# The glossary is static, so it is rendered once per process
+@lru_cache(maxsize=None)
+def glossary_html():
+    parts = []
+    for section, metrics in GLOSSARY_SECTIONS.items():
+        parts.append(f"<h3 style='font-size:15px; color:#333; font-weight:bold;'>{html.escape(section)}</h3>")
+        for metric in metrics:
+            explanation = GLOSSARY.get(metric, "")
+            parts.append(f"<p>{html.escape(metric)}: <em>{html.escape(explanation)}</em></p>")
+    return '\n'.join(parts)
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import KDTree
+
+import enriched_store
+from rating_pipeline import (
+    POSITION_GROUPS,
+    RATING_METRICS,
+    TOP_K,
+    compute_age,
+    find_position_column,
+    find_team_column,
+    latest_player_rows,
+)
+
+# Season averages that describe a player's profile: the 9 ratings plus a few metrics
+# covering physical output, chance creation, ball progression and defending
+SIMILARITY_METRICS = RATING_METRICS + [
+    'PSV-99', 'Distance', 'HI Count', 'ExpG', 'xA', 'ProgPass', 'ProgCarry', 'PsRec', 'Int', 'Tckl',
+]
+
+
+# Nearest-neighbour search over the players of one position group. Every (League, player)
+# is one point: the standardized cumulative averages from the player's latest match.
+# There is a KD-tree over all players and one per league, so a league filter is a plain
+# tree query and not a post-filter over all neighbours.
+class SimilarityIndex:
+    def __init__(self, players, features, team_column, position_column):
+        self.players = players.reset_index(drop=True)
+        self.features = features
+        self.team_column = team_column
+        self.position_column = position_column
+
+        self.rows = {None: np.arange(len(self.players))}
+        self.rows.update(self.players.groupby('League', observed=True).indices)
+        self.trees = {league: KDTree(features[rows]) for league, rows in self.rows.items()}
+
+    def __len__(self):
+        return len(self.players)
+
+    # The k players closest to player_id (optionally only from one league), as a display
+    # table with the distance in standard deviations ('Difference')
+    def similar(self, player_id, league=None, k=TOP_K):
+        player_rows = np.flatnonzero(self.players['player_id'].to_numpy() == player_id)
+        if not len(player_rows) or league not in self.trees:
+            return self.players.iloc[:0]
+
+        # A player listed in several leagues is compared by their most recent profile
+        query_row = player_rows[np.argmax(self.players['Date'].to_numpy()[player_rows])]
+        rows = self.rows[league]
+        distances, neighbours = self.trees[league].query(
+            self.features[query_row:query_row + 1], k=min(k + len(player_rows), len(rows))
+        )
+        hits = rows[neighbours[0]]
+        keep = self.players['player_id'].to_numpy()[hits] != player_id
+        hits, distances = hits[keep][:k], distances[0][keep][:k]
+
+        similar = self.players.iloc[hits]
+        table = pd.DataFrame({
+            'Player': similar['playerFullName'].to_numpy(),
+            'Age': compute_age(similar['DOB']).round(0).astype(int).to_numpy(),
+            'Team': similar[self.team_column].to_numpy() if self.team_column else '',
+            'Position': similar[self.position_column].to_numpy(),
+            'League': similar['League'].to_numpy(),
+            'Difference': [f"{distance:.2f}" for distance in distances],
+        })
+        table.index = table.index + 1
+        table.index.name = 'Rank'
+        return table
+
+
+# Build one SimilarityIndex per position group from the enriched data. Groups without
+# players map to None.
+def build_similarity_indexes(data, metrics=SIMILARITY_METRICS):
+    position_column = find_position_column(data)
+    team_column = find_team_column(data)
+    feature_columns = [f'{metric}_cum_avg' for metric in metrics if f'{metric}_cum_avg' in data.columns]
+    player_columns = ['player_id', 'playerFullName', 'DOB', 'League', 'Date', position_column]
+    if team_column:
+        player_columns.append(team_column)
+
+    latest = latest_player_rows(data, player_columns + feature_columns)
+
+    indexes = {}
+    for group, positions in POSITION_GROUPS.items():
+        players = latest[latest[position_column].isin(positions)]
+        if players.empty:
+            indexes[group] = None
+            continue
+
+        # Standardize within the group so metrics on different scales weigh the same;
+        # missing averages sit at the group mean
+        values = players[feature_columns].astype(float)
+        std = values.std(ddof=0)
+        values = ((values - values.mean()) / std.where(std > 0, 1)).fillna(0.0)
+        indexes[group] = SimilarityIndex(
+            players[player_columns], values.to_numpy(), team_column, position_column
+        )
+    return indexes
+
+
+# Return the similarity indexes of one season. Like the enriched partitions they are
+# built once per host, stored next to them and loaded once per process.
+def load_or_build(data_version, season):
+    return enriched_store.load_or_build_artifact(
+        data_version, f'similar_{season}',
+        lambda: build_similarity_indexes(enriched_store.open_season(data_version, season))
+    )
@@ -0,0 +1,47 @@
+import threading
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# Coalesce identical concurrent calls: the first call for a key computes, calls with the
+# same key that arrive while it runs wait for it and get the same result (or exception).
+# Nothing is kept once the computation has finished, so a later call computes again and
+# never sees stale data. The shared result must be treated as read-only by every caller.
+class SingleFlight:
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, func, *args, **kwargs):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func(*args, **kwargs)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    # Number of computations in progress
+    def __len__(self):
+        with self._lock:
+            return len(self._flights)
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+from rating_pipeline import (
+    ALL_METRICS,
+    COUNT_METRICS,
+    PERCENTAGE_METRICS,
+    PHYSICAL_METRICS,
+    POSITION_GROUPS,
+)
+
+# Positions that can appear in the synthetic data (every position used by a group)
+SYNTHETIC_POSITIONS = sorted({pos for positions in POSITION_GROUPS.values() for pos in positions})
+
+
+# Build a raw frame shaped like the Google Drive parquet (strings with decimal commas and
+# percent signs, missing physical tracking for some matches) so the pipeline can be
+# exercised offline without the real dataset
+def make_synthetic_data(n_players=300, n_weeks=10, leagues=('Bundesliga', '2. Bundesliga'),
+                        teams_per_league=6, seed=0, n_seasons=1):
+    rng = np.random.default_rng(seed)
+
+    players = pd.DataFrame({
+        'playerFullName': [f'Player {i:04d}' for i in range(n_players)],
+        'DOB': pd.to_datetime('1990-01-01') + pd.to_timedelta(rng.integers(0, 365 * 15, n_players), unit='D'),
+        'League': rng.choice(list(leagues), n_players),
+        'Position_x': rng.choice(SYNTHETIC_POSITIONS, n_players),
+    })
+    # Two different players sharing a full name (told apart by their birthdate)
+    if n_players > 1:
+        players.loc[1, 'playerFullName'] = players.loc[0, 'playerFullName']
+    players['Team_x'] = [
+        f'{league} Team {team}'
+        for league, team in zip(players['League'], rng.integers(0, teams_per_league, n_players))
+    ]
+
+    # Every player appears in most (not all) matchdays of every season
+    rows = players.loc[players.index.repeat(n_weeks * n_seasons)].reset_index(drop=True)
+    rows['Week'] = np.tile(np.arange(1, n_weeks + 1), n_players * n_seasons).astype(float)
+    season = np.tile(np.repeat(np.arange(n_seasons), n_weeks), n_players)
+    keep = rng.random(len(rows)) < 0.85
+    rows, season = rows[keep].reset_index(drop=True), season[keep]
+    n_rows = len(rows)
+
+    # Seasons start in late August, the last one is 2024-25
+    season_start = pd.Timestamp('2024-08-23') - pd.to_timedelta((n_seasons - 1 - season) * 364, unit='D')
+    rows['Date'] = (
+        season_start
+        + pd.to_timedelta((rows['Week'].to_numpy() - 1) * 7, unit='D')
+        + pd.to_timedelta(rng.integers(0, 3, n_rows), unit='D')
+    )
+    rows['Min'] = rng.integers(1, 91, n_rows).astype(str)
+
+    for metric in ALL_METRICS:
+        if metric in PERCENTAGE_METRICS:
+            values = pd.Series(np.round(rng.uniform(0, 100, n_rows), 1)).astype(str) + '%'
+        elif metric in COUNT_METRICS:
+            values = pd.Series(rng.poisson(2.0, n_rows)).astype(str)
+        else:
+            values = pd.Series(np.round(rng.gamma(2.0, 1.5, n_rows), 2)).astype(str).str.replace('.', ',')
+        # Sprinkle single missing values across all metrics
+        values[rng.random(n_rows) < 0.05] = None
+        rows[metric] = values
+
+    # Physical tracking is missing for whole matches (stays NaN after the conditional fill)
+    no_tracking = rng.random(n_rows) < 0.1
+    rows.loc[no_tracking, PHYSICAL_METRICS] = None
+
+    return rows
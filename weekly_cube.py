@@ -0,0 +1,232 @@
+import numpy as np
+import pandas as pd
+
+import enriched_store
+from rating_pipeline import (
+    METRICS_FOR_CUM_AVG,
+    TOP_K,
+    aggregation_for,
+    find_position_column,
+    find_team_column,
+    running_columns,
+)
+
+
+# Pre-aggregated weekly cells of one (Season, League) partition, for aggregating any
+# matchday selection per player without touching the rows.
+#
+# A cell is one (player, position, Week). Cells are sorted by player, position and week,
+# so the cells of a (player, position) "segment" are contiguous. For every summed column
+# there is a prefix sum over the cells (plus a prefix count of non-missing values for
+# averaged metrics), so any run of consecutive weeks is prefix[hi] - prefix[lo] per
+# segment: selecting all 34 matchdays costs the same as selecting one.
+#
+# Columns aggregated with 'last' (running averages, Age, team, position) are not copied:
+# a cell stores the sorted position of its last row, and columns with missing values get
+# the position of the last non-missing value up to that cell. The values themselves are
+# read from the enriched partition at query time.
+#
+# The arrays are stored as .npy files and memory-mapped read-only (see
+# enriched_store.write_array_artifact), so every process on the host shares one copy.
+class WeeklyCube:
+    def __init__(self, data, metrics=METRICS_FOR_CUM_AVG):
+        self.team_column = find_team_column(data)
+        self.position_column = find_position_column(data)
+        self.metrics = [metric for metric in metrics if metric in data.columns]
+        self.mean_metrics = [metric for metric in self.metrics if aggregation_for(metric) == 'mean']
+        self.sum_columns = self.metrics + ['Min']
+        self.last_columns = ['Age'] + [
+            column for metric in self.metrics for column in running_columns(metric) if column in data.columns
+        ] + [column for column in (self.team_column, self.position_column) if column]
+
+        weeks = data['Week'].to_numpy(dtype=float)
+        self.weeks = np.unique(weeks[~np.isnan(weeks)])
+        position_codes, self.positions = pd.factorize(data[self.position_column])
+        players = data['player_id'].to_numpy()
+
+        # Rows without a matchday are never selected
+        rows = np.flatnonzero(~np.isnan(weeks))
+        week_index = np.searchsorted(self.weeks, weeks[rows])
+        sort = np.lexsort((rows, week_index, position_codes[rows], players[rows]))
+        self.order = rows[sort].astype(np.int32)
+        week_index = week_index[sort]
+        sorted_players, sorted_positions = players[self.order], position_codes[self.order]
+
+        new_segment = np.ones(len(self.order), dtype=bool)
+        new_segment[1:] = (sorted_players[1:] != sorted_players[:-1]) | (sorted_positions[1:] != sorted_positions[:-1])
+        new_cell = new_segment.copy()
+        new_cell[1:] |= week_index[1:] != week_index[:-1]
+
+        segment_starts = np.flatnonzero(new_segment)
+        self.segment_player = sorted_players[segment_starts]
+        self.segment_position = sorted_positions[segment_starts]
+        segment_of_row = np.cumsum(new_segment) - 1
+
+        cell_starts = np.flatnonzero(new_cell)
+        self.cell_start = cell_starts.astype(np.int32)
+        self.cell_end = (np.append(cell_starts[1:], len(self.order)) - 1).astype(np.int32)
+        self.cell_key = segment_of_row[cell_starts].astype(np.int64) * len(self.weeks) + week_index[cell_starts]
+
+        # Prefix sums (and counts) over the cells, with a leading row of zeros
+        self.sum_prefix = np.zeros((len(cell_starts) + 1, len(self.sum_columns)))
+        self.count_prefix = np.zeros((len(cell_starts) + 1, len(self.mean_metrics)), dtype=np.int32)
+        for position, column in enumerate(self.sum_columns):
+            values = data[column].to_numpy(dtype=float)[self.order]
+            present = ~np.isnan(values)
+            if len(cell_starts):
+                np.cumsum(np.add.reduceat(np.where(present, values, 0.0), cell_starts), out=self.sum_prefix[1:, position])
+                if column in self.mean_metrics:
+                    counts = np.add.reduceat(present.astype(np.int32), cell_starts)
+                    np.cumsum(counts, out=self.count_prefix[1:, self.mean_metrics.index(column)])
+
+        # Forward-filled position of the last non-missing value within each segment, one
+        # column per 'last' column that has missing values
+        row_segment_start = segment_starts[segment_of_row]
+        self.source_columns = []
+        sources = []
+        for column in self.last_columns:
+            missing = data[column].isna().to_numpy()[self.order]
+            if not missing.any():
+                continue
+            filled = np.maximum.accumulate(np.where(missing, -1, np.arange(len(self.order))))
+            filled[filled < row_segment_start] = -1
+            self.source_columns.append(column)
+            sources.append(filled[self.cell_end].astype(np.int32))
+        self.sources = np.column_stack(sources) if sources else np.empty((len(cell_starts), 0), dtype=np.int32)
+
+    # Split the selected weeks into runs of consecutive cube weeks, as (first, last) indexes
+    def _week_runs(self, weeks):
+        selected = np.unique(np.asarray(list(weeks), dtype=float))
+        index = np.searchsorted(self.weeks, selected)
+        index = index[(index < len(self.weeks)) & (self.weeks[np.minimum(index, len(self.weeks) - 1)] == selected)]
+        if not len(index):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        breaks = np.flatnonzero(np.diff(index) != 1) + 1
+        return index[np.r_[0, breaks]], index[np.r_[breaks - 1, len(index) - 1]]
+
+    # Same result as engine.aggregate_players on the partition rows of the selected weeks
+    # and positions (all positions when positions is None)
+    def aggregate_players(self, data, weeks, positions, metrics, minutes_total=None):
+        metrics = [metric for metric in metrics if metric in self.metrics]
+        first, last = self._week_runs(weeks)
+        segments = np.arange(len(self.segment_player))
+        if positions is not None:
+            codes = np.flatnonzero(self.positions.isin(list(positions)))
+            segments = segments[np.isin(self.segment_position, codes)]
+
+        # Cell range [lo, hi) of every segment and week run
+        base = segments[:, None].astype(np.int64) * len(self.weeks)
+        lo = np.searchsorted(self.cell_key, base + first[None, :], side='left')
+        hi = np.searchsorted(self.cell_key, base + last[None, :], side='right')
+        selected = hi > lo
+        has_cells = selected.any(axis=1)
+        segments, lo, hi, selected = segments[has_cells], lo[has_cells], hi[has_cells], selected[has_cells]
+
+        player_ids, player_of_segment = np.unique(self.segment_player[segments], return_inverse=True)
+        n_players = len(player_ids)
+
+        def per_player_sum(prefix, columns):
+            columns = np.asarray(columns, dtype=np.int64)
+            segment_sums = (prefix[hi[:, :, None], columns] - prefix[lo[:, :, None], columns]).sum(axis=1)
+            sums = np.zeros((n_players, len(columns)), dtype=segment_sums.dtype)
+            np.add.at(sums, player_of_segment, segment_sums)
+            return sums
+
+        # Row (in the partition) of the last value of the 'last' columns per player. The
+        # latest selected week wins within a segment, the latest row across segments.
+        def player_rows(positions):
+            rows = np.where(positions >= 0, self.order[np.maximum(positions, 0)], -1)
+            result = np.full((n_players,) + rows.shape[1:], -1, dtype=np.int64)
+            np.maximum.at(result, player_of_segment, rows)
+            return result
+
+        end = np.maximum(np.where(selected, hi - 1, -1), 0)
+        last_row = player_rows(np.where(selected, self.cell_end[end], -1).max(axis=1, initial=-1))
+        # Columns with missing values: the last non-missing value inside the selected cells
+        source = self.sources[end]
+        start = self.cell_start[np.minimum(lo, len(self.cell_start) - 1)]
+        inside = selected[:, :, None] & (source >= start[:, :, None])
+        source_rows = player_rows(np.where(inside, source, -1).max(axis=1, initial=-1))
+
+        def last(column):
+            if column in self.source_columns:
+                rows = source_rows[:, self.source_columns.index(column)]
+            else:
+                rows = last_row
+            return data[column].array.take(rows, allow_fill=True)
+
+        sum_index = [self.sum_columns.index(metric) for metric in metrics] + [self.sum_columns.index('Min')]
+        sums = per_player_sum(self.sum_prefix, sum_index)
+        mean_index = [self.mean_metrics.index(metric) for metric in metrics if metric in self.mean_metrics]
+        counts = per_player_sum(self.count_prefix, mean_index) if mean_index else None
+
+        columns = {'player_id': player_ids, 'playerFullName': last('playerFullName'), 'Age': last('Age')}
+        for position, metric in enumerate(metrics):
+            if metric in self.mean_metrics:
+                count = counts[:, mean_index.index(self.mean_metrics.index(metric))]
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    columns[metric] = np.where(count > 0, sums[:, position] / count, np.nan)
+            else:
+                columns[metric] = sums[:, position]
+            for column in running_columns(metric):
+                if column in self.last_columns:
+                    columns[column] = last(column)
+        columns['Min'] = sums[:, -1]
+        for column in (self.team_column, self.position_column):
+            if column:
+                columns[column] = last(column)
+
+        aggregated = pd.DataFrame(columns)
+        if minutes_total is not None:
+            aggregated = aggregated.merge(minutes_total, on='player_id', how='left')
+        return aggregated
+
+    # Same result as engine.weekly_top_k on the partition rows of the positions: each
+    # matchday is aggregated from its own cells and ranked like engine.top_k (descending,
+    # ties in player order). The player columns of all winners are gathered in one take.
+    def weekly_top_k(self, data, positions, metrics, k=TOP_K):
+        metrics = [metric for metric in metrics if metric in self.metrics]
+        player_columns = ['player_id', 'playerFullName', 'Age']
+        player_columns += [column for column in (self.team_column, self.position_column) if column]
+        players, winners, offset = [], [], 0
+        ranked = {'Week': [], 'Metric': [], 'Rank': [], 'Value': []}
+        for week in self.weeks:
+            aggregated = self.aggregate_players(data, [week], positions, metrics)
+            for metric in metrics:
+                values = aggregated[metric].to_numpy(dtype=float)
+                present = np.flatnonzero(~np.isnan(values))
+                top = present[np.argsort(-values[present], kind='stable')[:k]]
+                winners.append(top + offset)
+                ranked['Week'].append(np.full(len(top), week))
+                ranked['Metric'].append(np.full(len(top), metric, dtype=object))
+                ranked['Rank'].append(np.arange(1, len(top) + 1))
+                ranked['Value'].append(values[top])
+            players.append(aggregated[player_columns])
+            offset += len(aggregated)
+
+        if not players:
+            return pd.DataFrame(columns=list(ranked) + player_columns)
+        weekly_top = pd.DataFrame({name: np.concatenate(parts) for name, parts in ranked.items()})
+        winners = pd.concat(players, ignore_index=True).take(np.concatenate(winners)).reset_index(drop=True)
+        return pd.concat([weekly_top, winners], axis=1)
+
+
+def _artifact_name(season, league):
+    return f'cube_{season}_{league}'
+
+
+# Return the weekly cube of one (Season, League) partition (built once per host, stored
+# next to the enriched partitions and memory-mapped once per process)
+def load_or_build(data_version, season, league, data):
+    return enriched_store.load_or_build_array_artifact(
+        data_version, _artifact_name(season, league), lambda: WeeklyCube(data)
+    )
+
+
+# Make sure the cube files of one partition exist, without opening the cube in this
+# process (for the warm-up, which builds leagues nobody may open here)
+def build(data_version, season, league, data):
+    enriched_store.build_once(
+        enriched_store.array_artifact_path(data_version, _artifact_name(season, league)),
+        lambda: WeeklyCube(data), enriched_store.write_array_artifact
+    )